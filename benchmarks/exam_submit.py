@@ -0,0 +1,95 @@
+"""Exam submission throughput.
+
+Registers one student, reads the exam's questions and options through the API
+and fires --submissions attempts with random answers, --concurrency at a time:
+
+    python benchmarks/exam_submit.py --url http://127.0.0.1:9000 --exam 1 --submissions 10000 --concurrency 500
+
+The answer key is cached after the first submission, so steady-state requests
+cost one INSERT of the attempt row.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from login_load import register_users, summary
+
+
+async def fetch_all(client: httpx.AsyncClient, path: str, **params):
+    items, page = [], 1
+    while True:
+        response = await client.get(path, params={**params, 'page': page, 'size': 100})
+        response.raise_for_status()
+        data = response.json()
+        items.extend(data['items'])
+        if page >= data['pages']:
+            return items
+        page += 1
+
+
+async def load_exam(client: httpx.AsyncClient, exam_id: int):
+    questions = await fetch_all(client, '/question/', exam_id=exam_id)
+    options = await asyncio.gather(*(fetch_all(client, '/option/', question_id=question['id'])
+                                     for question in questions))
+    return {question['id']: [option['id'] for option in question_options]
+            for question, question_options in zip(questions, options)}
+
+
+def random_answers(exam):
+    return {str(question_id): random.sample(options, 1) if options else []
+            for question_id, options in exam.items()}
+
+
+async def submit(client, exam_id, headers, exam, slots, latencies, errors):
+    async with slots:
+        started = time.perf_counter()
+        try:
+            response = await client.post(f'/exam/{exam_id}/submit', json={'answers': random_answers(exam)},
+                                         headers=headers)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(args):
+    password = 'bench-password'
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        username, = await register_users(client, 1, password)
+        response = await client.post('/auth/login', data={'username': username, 'password': password})
+        response.raise_for_status()
+        headers = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+        exam = await load_exam(client, args.exam)
+        if not exam:
+            raise SystemExit(f'exam {args.exam} has no questions')
+
+        slots = asyncio.Semaphore(args.concurrency)
+        latencies, errors = [], []
+        started = time.perf_counter()
+        await asyncio.gather(*(submit(client, args.exam, headers, exam, slots, latencies, errors)
+                               for _ in range(args.submissions)))
+        elapsed = time.perf_counter() - started
+
+    return summary(latencies, errors, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:9000')
+    parser.add_argument('--exam', type=int, default=1)
+    parser.add_argument('--submissions', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    args = parser.parse_args()
+
+    for key, value in asyncio.run(run(args)).items():
+        print(f'{key:>10}: {value}')
+
+
+if __name__ == '__main__':
+    main()
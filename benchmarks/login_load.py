@@ -0,0 +1,103 @@
+"""Login throughput under concurrent catalog traffic.
+
+Registers --users accounts, then runs login clients and catalog clients side
+by side and reports both. The login rate limit must be raised for the run:
+
+    LOGIN_RATE_LIMIT=1000000 uvicorn course_app.main:course_app --port 9000
+    python benchmarks/login_load.py --url http://127.0.0.1:9000 --logins 20 --catalog 50
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from concurrency import percentile
+
+
+async def register_users(client: httpx.AsyncClient, count: int, password: str):
+    prefix = uuid.uuid4().hex[:8]
+    usernames = []
+    for i in range(count):
+        username = f'bench_{prefix}_{i}'
+        response = await client.post('/auth/register/', json={
+            'id': 0, 'first_name': 'bench', 'last_name': 'bench', 'username': username,
+            'phone_number': None, 'password': password, 'age': None, 'profile_image': None,
+            'bio': '', 'role': 'student',
+        })
+        response.raise_for_status()
+        usernames.append(username)
+    return usernames
+
+
+async def login_worker(client, usernames, password, deadline, latencies, errors, offset):
+    i = offset
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post('/auth/login', data={'username': usernames[i % len(usernames)],
+                                                          'password': password})
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+        i += 1
+
+
+async def catalog_worker(client, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get('/course/')
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 500:
+            errors.append(response.status_code)
+
+
+def summary(latencies, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run(args):
+    password = 'bench-password'
+    limits = httpx.Limits(max_connections=args.logins + args.catalog + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        usernames = await register_users(client, args.users, password)
+
+        login_latencies, login_errors = [], []
+        catalog_latencies, catalog_errors = [], []
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(login_worker(client, usernames, password, deadline, login_latencies, login_errors, i)
+              for i in range(args.logins)),
+            *(catalog_worker(client, deadline, catalog_latencies, catalog_errors) for _ in range(args.catalog)),
+        )
+        elapsed = time.perf_counter() - started
+
+    return {'login': summary(login_latencies, login_errors, elapsed),
+            'catalog': summary(catalog_latencies, catalog_errors, elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:9000')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--logins', type=int, default=20, help='concurrent login clients')
+    parser.add_argument('--catalog', type=int, default=50, help='concurrent catalog clients')
+    parser.add_argument('--duration', type=float, default=20)
+    args = parser.parse_args()
+
+    for name, result in asyncio.run(run(args)).items():
+        print(name)
+        for key, value in result.items():
+            print(f'{key:>10}: {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Reproducible API benchmark suite.
+
+Drives the main routes of a running server, seeded with seed_fixture.py,
+one scenario at a time with --concurrency clients, and writes requests/sec,
+p50/p95/p99 latency and DB queries per request (from /metrics) for every
+scenario to a JSON file. Request sequences are derived from --seed, so two
+runs issue the same requests:
+
+    LOGIN_RATE_LIMIT=1000000 uvicorn course_app.main:course_app --port 9000
+    python benchmarks/suite.py --fixture bench-fixture.json --output bench-$(git rev-parse --short HEAD).json
+
+Compare two result files; exits with status 1 if a scenario regressed by more
+than --max-regression percent:
+
+    python benchmarks/suite.py --compare bench-old.json bench-new.json --max-regression 10
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from login_load import summary
+
+
+LEVELS = ['beginner', 'intermediate', 'advanced']
+INCLUDES = ['lessons', 'assignments', 'exams', 'category', 'rating']
+SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def catalog(rng, fixture):
+    params = {'page': rng.randint(1, 20), 'order_by': rng.choice(['asc', 'desc', 'rating'])}
+    if rng.random() < 0.5:
+        params['level'] = rng.choice(LEVELS)
+    if rng.random() < 0.5:
+        low = rng.randrange(0, 400, 50)
+        params.update({'price[from]': low, 'price[to]': low + 100})
+    return 'GET', '/course/', {'params': params}
+
+
+def search(rng, fixture):
+    return 'GET', '/course/search', {'params': {'course_name': rng.choice(fixture['search_terms'])}}
+
+
+def course_detail(rng, fixture):
+    course_id = rng.randint(*fixture['course_ids'])
+    includes = rng.sample(INCLUDES, rng.randint(0, len(INCLUDES)))
+    return 'GET', f'/course/{course_id}/', {'params': {'include': ','.join(includes)} if includes else {}}
+
+
+def cart(rng, fixture):
+    return 'GET', '/cart/', {}
+
+
+def login(rng, fixture):
+    username = fixture['username'].format(rng.randrange(fixture['users']))
+    return 'POST', '/auth/login', {'data': {'username': username, 'password': fixture['password']}}
+
+
+def exam_detail(rng, fixture):
+    return 'GET', f'/exam/{rng.choice(fixture["exam_ids"])}/full', {}
+
+
+# сценарий -> (генератор запросов, шаблон маршрута в /metrics)
+SCENARIOS = {
+    'catalog': (catalog, '/course/'),
+    'search': (search, '/course/search'),
+    'course_detail': (course_detail, '/course/{course_id}/'),
+    'cart': (cart, '/cart/'),
+    'login': (login, '/auth/login'),
+    'exam_detail': (exam_detail, '/exam/{exam_id}/full'),
+}
+
+
+def parse_metrics(text):
+    queries, requests = defaultdict(float), defaultdict(float)
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        route = dict(LABEL.findall(labels or '')).get('route')
+        if name == 'db_queries_total':
+            queries[route] += float(value)
+        elif name == 'http_request_duration_seconds_count':
+            requests[route] += float(value)
+    return queries, requests
+
+
+async def scrape(client):
+    # старые коммиты без /metrics тоже можно мерить, просто без числа запросов к базе
+    try:
+        response = await client.get('/metrics')
+    except httpx.HTTPError:
+        return None
+    return parse_metrics(response.text) if response.status_code == 200 else None
+
+
+def queries_per_request(before, after, route):
+    if before is None or after is None:
+        return None
+    requests = after[1][route] - before[1][route]
+    if not requests:
+        return None
+    return round((after[0][route] - before[0][route]) / requests, 2)
+
+
+async def login_clients(client, fixture, count):
+    tokens = []
+    for i in range(count):
+        response = await client.post('/auth/login', data={'username': fixture['username'].format(i % fixture['users']),
+                                                          'password': fixture['password']})
+        response.raise_for_status()
+        tokens.append({'Authorization': f'Bearer {response.json()["access_token"]}'})
+    return tokens
+
+
+async def worker(client, make_request, fixture, rng, headers, deadline, latencies, errors, statuses):
+    while time.perf_counter() < deadline:
+        method, path, kwargs = make_request(rng, fixture)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, headers=headers, **kwargs)
+            statuses[response.status_code] += 1
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_scenario(client, name, fixture, tokens, args, record=True):
+    make_request, _ = SCENARIOS[name]
+    latencies, errors, statuses = [], [], Counter()
+    started = time.perf_counter()
+    deadline = started + (args.duration if record else args.warmup)
+    await asyncio.gather(*(worker(client, make_request, fixture, random.Random(f'{args.seed}:{name}:{i}'),
+                                  tokens[i], deadline, latencies, errors, statuses)
+                           for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    return {**summary(latencies, errors, elapsed),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())}}
+
+
+async def run(args):
+    fixture = json.loads(Path(args.fixture).read_text())
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        tokens = await login_clients(client, fixture, args.concurrency)
+        for name in args.scenarios or SCENARIOS:
+            if args.warmup:
+                await run_scenario(client, name, fixture, tokens, args, record=False)
+            before = await scrape(client)
+            result = await run_scenario(client, name, fixture, tokens, args)
+            after = await scrape(client)
+            result['queries_per_request'] = queries_per_request(before, after, SCENARIOS[name][1])
+            results[name] = result
+            print(f'{name:>14}: {result["rps"]:>9} rps  p50 {result["p50_ms"]:>8} ms  p95 {result["p95_ms"]:>8} ms  '
+                  f'p99 {result["p99_ms"]:>8} ms  queries/req {result["queries_per_request"]}')
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# для каждой метрики: True - больше значит лучше
+COMPARED = {'rps': True, 'p50_ms': False, 'p95_ms': False, 'p99_ms': False, 'queries_per_request': False}
+
+
+def compare(old_path, new_path, max_regression):
+    old = json.loads(Path(old_path).read_text())['scenarios']
+    new = json.loads(Path(new_path).read_text())['scenarios']
+    regressions = 0
+    for name in sorted(old.keys() & new.keys()):
+        for metric, higher_is_better in COMPARED.items():
+            before, after = old[name].get(metric), new[name].get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            regressed = (-change if higher_is_better else change) > max_regression
+            regressions += regressed
+            flag = '  REGRESSION' if regressed else ''
+            print(f'{name:>14} {metric:>20}: {before:>10} -> {after:>10} ({change:+.1f}%){flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:9000')
+    parser.add_argument('--fixture', default='bench-fixture.json', help='manifest written by seed_fixture.py')
+    parser.add_argument('--scenario', action='append', dest='scenarios', choices=SCENARIOS)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20, help='seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=3, help='unrecorded seconds before each scenario')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--max-regression', type=float, default=10, help='percent, used with --compare')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.max_regression) else 0)
+
+    scenarios = asyncio.run(run(args))
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'url': args.url,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'seed': args.seed,
+            'fixture': json.loads(Path(args.fixture).read_text())['counts'],
+            'python': platform.python_version(),
+        },
+        'scenarios': scenarios,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+    print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
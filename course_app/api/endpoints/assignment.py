@@ -1,38 +1,35 @@
 from course_app.db.models import Assignment
 from course_app.db.schema import AssignmentSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
+from course_app.db.database import get_db
+from course_app.api.pagination import paginate_list
+from course_app.api.endpoints.course import invalidate_course_includes
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, APIRouter
-from typing import Optional, List
+from fastapi_pagination import Page
+from typing import Optional
 
 assignment_router = APIRouter(prefix='/assignment', tags=['Assignments'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @assignment_router.post('/', response_model=AssignmentSchema)
-async def create_assignment(assignment: AssignmentSchema, db: Session = Depends(get_db)):
+async def create_assignment(assignment: AssignmentSchema, db: AsyncSession = Depends(get_db)):
     assignment_db = Assignment(**assignment.dict())
     db.add(assignment_db)
-    db.commit()
-    db.refresh(assignment_db)
+    await db.commit()
+    await db.refresh(assignment_db)
+    await invalidate_course_includes(assignment_db.course_id)
     return assignment_db
 
 
-@assignment_router.get('/', response_model=List[AssignmentSchema])
-async def list_assignment(db: Session = Depends(get_db)):
-    return db.query(Assignment).all()
+@assignment_router.get('/', response_model=Page[AssignmentSchema])
+async def list_assignment(course_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await paginate_list(db, Assignment, course_id=course_id)
 
 
 @assignment_router.get('/{assignment_id}/', response_model=AssignmentSchema)
-async def detail_assignment(assignment_id: int, db: Session = Depends(get_db)):
-    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+async def detail_assignment(assignment_id: int, db: AsyncSession = Depends(get_db)):
+    assignment = await db.scalar(select(Assignment).where(Assignment.id == assignment_id))
 
     if assignment is None:
         raise HTTPException(status_code=404, detail='Андай маалымат жок')
@@ -40,27 +37,30 @@ async def detail_assignment(assignment_id: int, db: Session = Depends(get_db)):
 
 
 @assignment_router.put('/{assignment_id}/', response_model=AssignmentSchema)
-async def update_assignment(assignment_id: int, assignment: AssignmentSchema, db: Session = Depends(get_db)):
-    assignment_db = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+async def update_assignment(assignment_id: int, assignment: AssignmentSchema, db: AsyncSession = Depends(get_db)):
+    assignment_db = await db.scalar(select(Assignment).where(Assignment.id == assignment_id))
 
     if assignment_db is None:
         raise HTTPException(status_code=404, detail='Андай маалымат жок')
 
+    old_course_id = assignment_db.course_id
     for assignment_key, assignment_value in assignment.dict().items():
         setattr(assignment_db, assignment_key, assignment_value)
 
-    db.commit()
-    db.refresh(assignment_db)
+    await db.commit()
+    await db.refresh(assignment_db)
+    await invalidate_course_includes(old_course_id, assignment_db.course_id)
     return assignment_db
 
 
 @assignment_router.delete('/{assignment_id}/')
-async def delete_category(assignment_id: int, db: Session = Depends(get_db)):
-    assignment_db = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+async def delete_category(assignment_id: int, db: AsyncSession = Depends(get_db)):
+    assignment_db = await db.scalar(select(Assignment).where(Assignment.id == assignment_id))
 
     if assignment_db is None:
         raise HTTPException(status_code=404, detail='Андай маалымат жок')
 
-    db.delete(assignment_db)
-    db.commit()
+    await db.delete(assignment_db)
+    await db.commit()
+    await invalidate_course_includes(assignment_db.course_id)
     return {'message': 'this assignment is deleted'}
@@ -1,81 +1,228 @@
-from course_app.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTE, REFRESH_TOKEN_EXPIRE_DAYS, ALGORITHM
-from jose import jwt
+from course_app.config import (SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTE, REFRESH_TOKEN_EXPIRE_DAYS, ALGORITHM,
+                               REFRESH_TOKEN_SWEEP_INTERVAL, REFRESH_TOKEN_SWEEP_BATCH, LOGIN_RATE_LIMIT, AUTH_CACHE_TTL,
+                               REGISTER_BULK_MAX_USERS, BULK_INSERT_BATCH_SIZE, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS,
+                               PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_QUEUE_TIMEOUT)
+from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import timedelta, datetime
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
-from course_app.db.database import SessionLocal
-from typing import Optional
-from course_app.db.schema import UserProfileSchema
-from course_app.db.models import UserProfile, RefreshToken, Cart, Favorite
+from course_app.db.database import get_db, AsyncSessionLocal
+from course_app.db.bulk import conflict_insert, chunked
+from course_app import cache
+from course_app.mailer import email_queue
+from typing import Optional, List
+from course_app.db.schema import UserProfileSchema, CurrentUserSchema
+from course_app.db.models import UserProfile, RefreshToken, Cart, Favorite, RoleChoices
 from fastapi import Depends, HTTPException, APIRouter
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, insert
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
-import smtplib
+from redis.exceptions import RedisError
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
 
-try:
-    server = smtplib.SMTP()
-    server.connect('smpt.gmail.com', 587)
-    server.ehlo()
-    server.starttls()
 
-    server.login('tahminaturganbaeva71@gmail.com', 'myactorwebsa')
+logger = logging.getLogger(__name__)
 
-    server.sendmail('tahminaturganbaeva71@gmail.com', 'turganbaevattt@gmail.com', 'hi there')
-    server.close()
-    print('email sent successfully')
+auth_router = APIRouter(prefix='/auth', tags=['Auth'])
 
-except Exception as e:
-    print(f'your email was not sent , ошибка {e}')
+REVOKED_TOKENS_KEY = 'auth:revoked_refresh'
 
 
+oauth2_schema = OAuth2PasswordBearer(tokenUrl='/auth/login')
+password_context = CryptContext(schemes=['bcrypt'], deprecated="auto",
+                                bcrypt__default_rounds=BCRYPT_ROUNDS,
+                                bcrypt__min_rounds=BCRYPT_ROUNDS,
+                                bcrypt__max_rounds=BCRYPT_ROUNDS)
 
+# bcrypt отпускает GIL, поэтому хватает пула потоков; семафор ограничивает очередь
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+password_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
 
-auth_router = APIRouter(prefix='/auth', tags=['Auth'])
 
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTE))
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-oauth2_schema = OAuth2PasswordBearer(tokenUrl='/auth/login')
-password_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
+
+def hash_token(token: str):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(db: AsyncSession, user_id: int, username: str):
+    # в базе хранится только sha256 токена, поиск идет по jti
+    jti = uuid.uuid4().hex
+    expires_delta = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    refresh_token = create_access_token({'sub': username, 'jti': jti, 'type': 'refresh'}, expires_delta)
+    db.add(RefreshToken(jti=jti, token_hash=hash_token(refresh_token), user_id=user_id,
+                        expires_at=datetime.utcnow() + expires_delta))
+    return refresh_token
+
+
+def decode_refresh_token(refresh_token: str):
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=400, detail='маалымат туура эмеc')
+    if payload.get('type') != 'refresh' or not payload.get('jti'):
+        raise HTTPException(status_code=400, detail='маалымат туура эмеc')
+    return payload
+
+
+def credentials_error():
+    return HTTPException(status_code=401, detail='Токен жараксыз', headers={'WWW-Authenticate': 'Bearer'})
+
+
+def decode_access_token(token: str):
+    # HMAC-проверка и разбор JWT на каждый запрос не нужны, пока токен в локальном кэше
+    key = f'auth:claims:{hash_token(token)}'
+    claims = cache.auth_cache.get(key)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_error()
+    if claims.get('type') == 'refresh' or not claims.get('sub'):
+        raise credentials_error()
+    ttl = min(AUTH_CACHE_TTL, claims['exp'] - time.time())
+    if ttl > 0:
+        cache.auth_cache.set(key, claims, ttl)
+    return claims
+
+
+async def load_current_user(username: str):
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(select(UserProfile.id, UserProfile.username, UserProfile.role)
+                                .where(UserProfile.username == username))).first()
+    if row is None:
+        return None
+    return {'id': row.id, 'username': row.username, 'role': row.role}
+
+
+async def get_current_user(token: str = Depends(oauth2_schema)):
+    claims = decode_access_token(token)
+    username = claims['sub']
+    user = await cache.read_through('current_user', f'auth:user:{username}', AUTH_CACHE_TTL,
+                                    lambda: load_current_user(username), local_ttl=AUTH_CACHE_TTL,
+                                    local=cache.auth_cache)
+    if user is None:
+        raise credentials_error()
+    return CurrentUserSchema(**user)
+
+
+async def is_token_revoked(jti: str):
+    if cache.redis_client is None:
+        return False
+    try:
+        return await cache.redis_client.zscore(REVOKED_TOKENS_KEY, jti) is not None
+    except RedisError as e:
+        logger.warning('revocation check failed: %s', e)
+        return False
+
+
+async def revoke_token(jti: str, expires_at: int):
+    if cache.redis_client is None:
+        return
+    try:
+        await cache.redis_client.zadd(REVOKED_TOKENS_KEY, {jti: expires_at})
+    except RedisError as e:
+        logger.warning('revocation of %s failed: %s', jti, e)
 
 
-async def get_db():
-    db = SessionLocal()
+async def consume_refresh_token(db: AsyncSession, refresh_token: str):
+    payload = decode_refresh_token(refresh_token)
+    if await is_token_revoked(payload['jti']):
+        raise HTTPException(status_code=400, detail='маалымат туура эмеc')
+    # один DELETE ... RETURNING: из двух параллельных запросов с одним токеном пройдет только один
+    user_id = await db.scalar(
+        delete(RefreshToken)
+        .where(RefreshToken.jti == payload['jti'], RefreshToken.token_hash == hash_token(refresh_token))
+        .returning(RefreshToken.user_id)
+    )
+    if user_id is None:
+        raise HTTPException(status_code=400, detail='маалымат туура эмеc')
+    return payload, user_id
+
+
+async def sweep_refresh_tokens():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                while True:
+                    expired = (select(RefreshToken.id).where(RefreshToken.expires_at < datetime.utcnow())
+                               .limit(REFRESH_TOKEN_SWEEP_BATCH))
+                    result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(expired)))
+                    await db.commit()
+                    if result.rowcount < REFRESH_TOKEN_SWEEP_BATCH:
+                        break
+            if cache.redis_client is not None:
+                await cache.redis_client.zremrangebyscore(REVOKED_TOKENS_KEY, '-inf', time.time())
+        except (SQLAlchemyError, RedisError) as e:
+            logger.warning('refresh token sweep failed: %s', e)
+        await asyncio.sleep(REFRESH_TOKEN_SWEEP_INTERVAL)
+
+
+async def run_password_job(func, *args):
     try:
-        yield db
+        await asyncio.wait_for(password_slots.acquire(), timeout=PASSWORD_HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail='Сервер перегружен, попробуйте позже')
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
     finally:
-        db.close()
+        password_slots.release()
 
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTE))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+async def verify_password(plain_password, hash_password):
+    """Returns (is_valid, new_hash); new_hash is set when the stored hash
+    was made with a different bcrypt cost and should be replaced."""
+    return await run_password_job(password_context.verify_and_update, plain_password, hash_password)
 
 
-def create_refresh_token(data: dict):
-    return create_access_token(data, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+async def get_password_hash(password):
+    return await run_password_job(password_context.hash, password)
 
 
-def verify_password(plain_password, hash_password):
-    return password_context.verify(plain_password, hash_password)
+def hash_many(passwords):
+    return [password_context.hash(password) for password in passwords]
 
 
-def get_password_hash(password):
-    return password_context.hash(password)
+async def get_password_hashes(passwords, chunk_size: int = 8):
+    # массовая регистрация занимает не больше половины потоков, чтобы login не ждал
+    concurrency = max(1, PASSWORD_HASH_WORKERS // 2)
+    chunks = list(chunked(passwords, chunk_size))
+    hashes = []
+    for start in range(0, len(chunks), concurrency):
+        results = await asyncio.gather(*(run_password_job(hash_many, chunk)
+                                         for chunk in chunks[start:start + concurrency]))
+        for result in results:
+            hashes.extend(result)
+    return hashes
+
+
+def send_welcome_email(email: str, first_name: str, username: str):
+    email_queue.send(email, 'Каттоо ийгиликтүү өттү',
+                     f'Саламатсызбы, {first_name}! Сиз {username} аты менен катталдыңыз.')
 
 
 @auth_router.post('/register/',)
-async def register(user: UserProfileSchema, db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.username==user.username).first()
-    if user_db:
-        raise HTTPException(status_code=400, detail='мындай username бар экен')
-    new_hash_pass = get_password_hash(user.password)
+async def register(user: UserProfileSchema, db: AsyncSession = Depends(get_db)):
+    new_hash_pass = await get_password_hash(user.password)
     new_user = UserProfile(
         first_name=user.first_name,
         last_name=user.last_name,
         username=user.username,
+        email=user.email,
         phone_number=user.phone_number,
         hashed_password=new_hash_pass,
         age=user.age,
@@ -84,53 +231,101 @@ async def register(user: UserProfileSchema, db: Session = Depends(get_db)):
         role=user.role
     )
 
+    # одна транзакция: id приходит из INSERT ... RETURNING при flush,
+    # повторный username ловит unique constraint
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
-    new_cart = Cart(users_id=new_user.id)
-    db.add(new_cart)
-    db.commit()
+    try:
+        await db.flush()
+        db.add_all([Cart(users_id=new_user.id), Favorite(user_id=new_user.id)])
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail='мындай username бар экен')
 
-    new_favorite = Favorite(user_id=new_user.id)
-    db.add(new_favorite)
-    db.commit()
+    if new_user.email:
+        send_welcome_email(new_user.email, new_user.first_name, new_user.username)
     return {'message': 'saved'}
 
 
-@auth_router.post('/login', dependencies=[Depends(RateLimiter(times=3, seconds=60))])
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(UserProfile).filter(UserProfile.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+@auth_router.post('/register/bulk')
+async def register_bulk(users: List[UserProfileSchema], current_user: CurrentUserSchema = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    if current_user.role != RoleChoices.teacher:
+        raise HTTPException(status_code=403, detail='Колдонуучуларды кошууга укугуңуз жок')
+    if len(users) > REGISTER_BULK_MAX_USERS:
+        raise HTTPException(status_code=400, detail=f'Бир жолу {REGISTER_BULK_MAX_USERS} колдонуучудан ашпашы керек')
+
+    usernames = [user.username for user in users]
+    if len(set(usernames)) != len(usernames):
+        raise HTTPException(status_code=400, detail='Тизмеде бирдей username бар')
+
+    hashes = await get_password_hashes([user.password for user in users])
+    rows = [{
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'username': user.username,
+        'email': user.email,
+        'phone_number': user.phone_number,
+        'hashed_password': hashed_password,
+        'age': user.age,
+        'profile_image': user.profile_image,
+        'bio': user.bio,
+        'role': user.role,
+    } for user, hashed_password in zip(users, hashes)]
+
+    # уже существующие username пропускаются, а не валят всю пачку
+    created = []
+    for batch in chunked(rows, BULK_INSERT_BATCH_SIZE):
+        result = await db.execute(
+            conflict_insert(db, UserProfile).values(batch)
+            .on_conflict_do_nothing(index_elements=[UserProfile.username])
+            .returning(UserProfile.id, UserProfile.username)
+        )
+        created.extend(result.all())
+
+    for batch in chunked(created, BULK_INSERT_BATCH_SIZE):
+        await db.execute(insert(Cart).values([{'users_id': row.id} for row in batch]))
+        await db.execute(insert(Favorite).values([{'user_id': row.id} for row in batch]))
+    await db.commit()
+
+    created_usernames = {row.username for row in created}
+    for row in rows:
+        if row['email'] and row['username'] in created_usernames:
+            send_welcome_email(row['email'], row['first_name'], row['username'])
+
+    return {'created': len(created), 'skipped': [name for name in usernames if name not in created_usernames]}
+
+
+@auth_router.post('/login', dependencies=[Depends(RateLimiter(times=LOGIN_RATE_LIMIT, seconds=60))])
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(UserProfile).where(UserProfile.username == form_data.username))
+    if not user:
         raise HTTPException(status_code=400, detail='маалымат туура эмеc')
+    is_valid, new_hash = await verify_password(form_data.password, user.hashed_password)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail='маалымат туура эмеc')
+    if new_hash:
+        user.hashed_password = new_hash
     access_token = create_access_token({'sub': user.username})
-    refresh_token = create_refresh_token({'sub': user.username})
-    token_db = RefreshToken(token=refresh_token, user_id=user.id)
-    db.add(token_db)
-    db.commit()
+    refresh_token = issue_refresh_token(db, user.id, user.username)
+    await db.commit()
     return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'bearer'}
 
 
 @auth_router.post('/logout')
-async def logout(refresh_token: str, db: Session = Depends(get_db)):
-
-    stored_token = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
-
-    if not stored_token:
-        raise HTTPException(status_code=400, detail='маалымат туура эмеc')
-
-    db.delete(stored_token)
-    db.commit()
+async def logout(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    payload, _ = await consume_refresh_token(db, refresh_token)
+    await db.commit()
+    await revoke_token(payload['jti'], payload['exp'])
     return {'message': 'вышли'}
 
 
 @auth_router.post('/refresh')
-async def refresh(refresh_token: str, db: Session = Depends(get_db)):
-    token_entry = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
-
-    if not token_entry:
-        raise HTTPException(status_code=400, detail='маалымат туура эмеc')
-
-    access_token = create_access_token({'sub': token_entry.user_id})
-
-    return {'access_token': access_token, 'token_type': 'bearer'}
\ No newline at end of file
+async def refresh(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    payload, user_id = await consume_refresh_token(db, refresh_token)
+    new_refresh_token = issue_refresh_token(db, user_id, payload['sub'])
+    await db.commit()
+    await revoke_token(payload['jti'], payload['exp'])
+
+    access_token = create_access_token({'sub': payload['sub']})
+    return {'access_token': access_token, 'refresh_token': new_refresh_token, 'token_type': 'bearer'}
@@ -1,80 +1,144 @@
 from fastapi import APIRouter, Depends, HTTPException
 from course_app.db.models import Course, Cart, CartItem
-from course_app.db.schema import CartSchema, CartItemSchema, CourseSchema, CartItemCreateSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
+from course_app.db.schema import (CartSchema, CartItemSchema, CourseSchema, CartItemCreateSchema, CartItemBatchSchema,
+                                  CurrentUserSchema)
+from course_app.db.database import get_db
+from course_app.db.bulk import conflict_insert
+from course_app.api.endpoints.auth import get_current_user
+from course_app.profiler import QueryBudget
+from course_app.cache import cache_get, cache_set, cache_delete
+from course_app.config import CACHE_TTL_CART, ITEMS_BATCH_MAX
+from sqlalchemy import select, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 cart_router = APIRouter(prefix='/cart', tags=['Cart'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def cart_cache_key(users_id: int):
+    return f'cart:{users_id}'
 
 
-@cart_router.get('/', response_model=CartSchema)
-async def cart_list(users_id: int, db: Session = Depends(get_db)):
-    cart = db.query(Cart).filter(Cart.users_id == users_id).first()
-    if not cart:
-        raise HTTPException(status_code=404, detail='корзина не найден')
-
-    cart_items = db.query(CartItem).filter(CartItem.cart_id==cart.id).all()
+async def load_cart(db: AsyncSession, users_id: int):
+    total = func.coalesce(func.sum(Course.price).over(), 0)
+    query = (select(Cart.id, Cart.users_id, CartItem.id.label('item_id'), CartItem.course_id,
+                    Course.course_name, Course.course_image, Course.price, total.label('total_price'))
+             .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+             .outerjoin(Course, Course.id == CartItem.course_id)
+             .where(Cart.users_id == users_id)
+             .order_by(CartItem.id))
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return None
 
-    total_price = sum(db.query(Course.price).filter(Course.id == item.course_id).scalar() for item in cart_items)
+    items = [{
+        'id': row.item_id,
+        'course_id': row.course_id,
+        'course': {'id': row.course_id, 'course_name': row.course_name,
+                   'course_image': row.course_image, 'price': float(row.price)},
+    } for row in rows if row.item_id is not None]
 
     return {
-        "id": cart.id,
-        "users_id": cart.users_id,
-        "items": cart.items,
-        "total_price": total_price
+        'id': rows[0].id,
+        'users_id': rows[0].users_id,
+        'items': items,
+        'total_price': float(rows[0].total_price),
     }
 
 
+@cart_router.get('/', response_model=CartSchema, dependencies=[Depends(QueryBudget(2))])
+async def cart_list(current_user: CurrentUserSchema = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    users_id = current_user.id
+    cart = await cache_get(cart_cache_key(users_id))
+    if cart is None:
+        cart = await load_cart(db, users_id)
+        if not cart:
+            raise HTTPException(status_code=404, detail='корзина не найден')
+        await cache_set(cart_cache_key(users_id), cart, CACHE_TTL_CART, tags=('carts',))
+
+    return cart
+
+
 @cart_router.post('/', response_model=CartItemSchema)
-async def cart_add(item_data: CartItemCreateSchema, users_id:int, db: Session = Depends(get_db)):
+async def cart_add(item_data: CartItemCreateSchema, current_user: CurrentUserSchema = Depends(get_current_user),
+                   db: AsyncSession = Depends(get_db)):
+    users_id = current_user.id
 
-    cart = db.query(Cart).filter(Cart.users_id == users_id).first()
+    cart = await db.scalar(select(Cart).where(Cart.users_id == users_id))
     if not cart:
         cart = Cart(users_id=users_id)
         db.add(cart)
-        db.commit()
-        db.refresh(cart)
+        await db.commit()
+        await db.refresh(cart)
 
-    course = db.query(Course).filter(Course.id ==item_data.course_id).first()
+    course = await db.scalar(select(Course).where(Course.id ==item_data.course_id))
     if not course:
         raise HTTPException(status_code=404, detail='курс не найден')
 
-    course_item = db.query(CartItem).filter(CartItem.cart_id==cart.id,
-                                            CartItem.course_id==item_data.course_id).first()
+    course_item = await db.scalar(select(CartItem).where(CartItem.cart_id==cart.id,
+                                                         CartItem.course_id==item_data.course_id))
 
     if course_item:
         raise HTTPException(status_code=404, detail='курс уже в корзине ')
 
     cart_item = CartItem(cart_id=cart.id, course_id=item_data.course_id)
     db.add(cart_item)
-    db.commit()
-    db.refresh(cart_item)
+    await db.commit()
+    await db.refresh(cart_item)
+    await cache_delete(cart_cache_key(users_id))
 
     return cart_item
 
 
+@cart_router.post('/items:batch', response_model=CartSchema, dependencies=[Depends(QueryBudget(5))])
+async def cart_add_batch(items: CartItemBatchSchema, current_user: CurrentUserSchema = Depends(get_current_user),
+                         db: AsyncSession = Depends(get_db)):
+    users_id = current_user.id
+    course_ids = list(dict.fromkeys(items.course_ids))
+    if len(course_ids) > ITEMS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f'Бир жолу {ITEMS_BATCH_MAX} курстан ашпашы керек')
+
+    # все курсы проверяются одним IN-запросом
+    if course_ids:
+        found = set((await db.scalars(select(Course.id).where(Course.id.in_(course_ids)))).all())
+        missing = [course_id for course_id in course_ids if course_id not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f'курс не найден: {", ".join(map(str, missing))}')
+
+    cart_id = await db.scalar(select(Cart.id).where(Cart.users_id == users_id))
+    if cart_id is None:
+        cart_id = await db.scalar(insert(Cart).values(users_id=users_id).returning(Cart.id))
+
+    # курсы, которые уже в корзине, пропускаются
+    if course_ids:
+        await db.execute(
+            conflict_insert(db, CartItem).values([{'cart_id': cart_id, 'course_id': course_id}
+                                                  for course_id in course_ids])
+            .on_conflict_do_nothing(index_elements=[CartItem.cart_id, CartItem.course_id])
+        )
+    await db.commit()
+
+    cart = await load_cart(db, users_id)
+    await cache_set(cart_cache_key(users_id), cart, CACHE_TTL_CART, tags=('carts',))
+    return cart
+
+
 @cart_router.delete('/{course_id}')
-async def cart_delete(course_id: int, users_id:int, db: Session = Depends(get_db)):
-    cart = db.query(Cart).filter(Cart.users_id==users_id).first()
+async def cart_delete(course_id: int, current_user: CurrentUserSchema = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_db)):
+    users_id = current_user.id
+    cart = await db.scalar(select(Cart).where(Cart.users_id==users_id))
 
     if not cart:
         raise HTTPException(status_code=404, detail='корзина не найден')
 
 
-    cart_item = db.query(CartItem).filter(CartItem.cart_id==cart.id, CartItem.course_id==course_id).first()
+    cart_item = await db.scalar(select(CartItem).where(CartItem.cart_id==cart.id, CartItem.course_id==course_id))
 
     if not cart_item:
         raise HTTPException(status_code=404, detail='курс отсутсвует в корзине')
 
-    db.delete(cart_item)
-    db.commit()
+    await db.delete(cart_item)
+    await db.commit()
+    await cache_delete(cart_cache_key(users_id))
     return {'Курс удален из корзины'}
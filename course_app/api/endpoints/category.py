@@ -1,47 +1,56 @@
 from course_app.db.models import Category
 from course_app.db.schema import CategorySchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, APIRouter
-from typing import Optional, List
+from course_app.db.database import get_db
+from course_app.api.pagination import paginate_list
+from course_app.cache import read_through, invalidate_tags
+from course_app.config import CACHE_TTL_CATEGORY, CACHE_LOCAL_TTL
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, APIRouter, Request
+from fastapi_pagination import Page
+from typing import Optional
+from urllib.parse import urlencode
 
 category_router = APIRouter(prefix='/category', tags=['Categories'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @category_router.post('/', response_model=CategorySchema)
-async def create_category(category: CategorySchema, db: Session = Depends(get_db)):
+async def create_category(category: CategorySchema, db: AsyncSession = Depends(get_db)):
     category_db = Category(category_name=category.category_name)
     db.add(category_db)
-    db.commit()
-    db.refresh(category_db)
+    await db.commit()
+    await db.refresh(category_db)
+    await invalidate_tags('categories')
     return category_db
 
 
-@category_router.get('/', response_model=List[CategorySchema])
-async def list_category(db: Session = Depends(get_db)):
-    return db.query(Category).all()
+@category_router.get('/', response_model=Page[CategorySchema])
+async def list_category(request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        page = await paginate_list(db, Category)
+        return page.model_dump(mode='json')
+
+    key = f'category:list:{urlencode(sorted(request.query_params.multi_items()))}'
+    return await read_through('category_list', key, CACHE_TTL_CATEGORY, load, tags=('categories',),
+                              local_ttl=CACHE_LOCAL_TTL)
 
 
 @category_router.get('/{category_id}/', response_model=CategorySchema)
-async def detail_category(category_id: int, db: Session = Depends(get_db)):
-    category = db.query(Category).filter(Category.id == category_id).first()
+async def detail_category(category_id: int, db: AsyncSession = Depends(get_db)):
+    async def load():
+        category = await db.scalar(select(Category).where(Category.id == category_id))
 
-    if category is None:
-        raise HTTPException(status_code=404, detail='Андай маалымат жок')
-    return category
+        if category is None:
+            raise HTTPException(status_code=404, detail='Андай маалымат жок')
+        return CategorySchema.model_validate(category, from_attributes=True).model_dump(mode='json')
+
+    return await read_through('category_detail', f'category:detail:{category_id}', CACHE_TTL_CATEGORY, load,
+                              tags=('categories',), local_ttl=CACHE_LOCAL_TTL)
 
 
 @category_router.put('/{category_id}/', response_model=CategorySchema)
-async def update_category(category_id: int, category: CategorySchema, db: Session = Depends(get_db)):
-    category_db = db.query(Category).filter(Category.id == category_id).first()
+async def update_category(category_id: int, category: CategorySchema, db: AsyncSession = Depends(get_db)):
+    category_db = await db.scalar(select(Category).where(Category.id == category_id))
 
     if category_db is None:
         raise HTTPException(status_code=404, detail='Андай маалымат жок')
@@ -49,18 +58,21 @@ async def update_category(category_id: int, category: CategorySchema, db: Sessio
     category_db.category_name = category.category_name
 
     db.add(category_db)
-    db.commit()
-    db.refresh(category_db)
+    await db.commit()
+    await db.refresh(category_db)
+    # название категории входит в ответ /course/{id}/?include=category
+    await invalidate_tags('categories', 'course_detail')
     return category_db
 
 
 @category_router.delete('/{category_id}/')
-async def delete_category(category_id: int, db: Session = Depends(get_db)):
-    category_db = db.query(Category).filter(Category.id == category_id).first()
+async def delete_category(category_id: int, db: AsyncSession = Depends(get_db)):
+    category_db = await db.scalar(select(Category).where(Category.id == category_id))
 
     if category_db is None:
         raise HTTPException(status_code=404, detail='Андай маалымат жок')
 
-    db.delete(category_db)
-    db.commit()
+    await db.delete(category_db)
+    await db.commit()
+    await invalidate_tags('categories', 'course_list', 'course_detail', 'carts')
     return {'message': 'this category is deleted'}
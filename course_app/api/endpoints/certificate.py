@@ -1,38 +1,84 @@
-from course_app.db.models import Certificate
-from course_app.db.schema import CertificateSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
+from course_app.db.models import (Certificate, CertificateBatch, Course, Exam, ExamAttempt, UserProfile,
+                                  RoleChoices)
+from course_app.db.schema import CertificateSchema, CertificateBulkSchema, CertificateBatchSchema, CurrentUserSchema
+from course_app.db.database import get_db
+from course_app.api.endpoints.auth import get_current_user
+from course_app.api.pagination import paginate_list
+from course_app.certificates import certificate_queue
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
 from fastapi import Depends, HTTPException, APIRouter
+from fastapi_pagination import Page
 
 certificate_router = APIRouter(prefix='/certificate', tags=['Certificates'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @certificate_router.post('/', response_model=CertificateSchema)
-async def certificate_create(certificate: CertificateSchema, db: Session = Depends(get_db)):
+async def certificate_create(certificate: CertificateSchema, db: AsyncSession = Depends(get_db)):
     certificate_db = Certificate(**certificate.dict())
     db.add(certificate_db)
-    db.commit()
-    db.refresh(certificate_db)
+    await db.commit()
+    await db.refresh(certificate_db)
+    # документ рисуется в фоне, письмо уходит после того как certificate_url заполнен
+    certificate_queue.enqueue([certificate_db.id])
     return certificate_db
 
 
-@certificate_router.get('/', response_model=List[CertificateSchema])
-async def certificate_list(db: Session = Depends(get_db)):
-    return db.query(Certificate).all()
+@certificate_router.post('/bulk', response_model=CertificateBatchSchema)
+async def certificate_bulk(bulk: CertificateBulkSchema, current_user: CurrentUserSchema = Depends(get_current_user),
+                           db: AsyncSession = Depends(get_db)):
+    if current_user.role != RoleChoices.teacher:
+        raise HTTPException(status_code=403, detail='Сертификат берүүгө укугуңуз жок')
+    if await db.scalar(select(Course.id).where(Course.id == bulk.course_id)) is None:
+        raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+
+    # по умолчанию - все студенты, сдавшие хотя бы один экзамен курса
+    if bulk.student_ids is None:
+        students = (select(ExamAttempt.student_id).join(Exam, Exam.id == ExamAttempt.exam_id)
+                    .where(Exam.course_id == bulk.course_id, ExamAttempt.passed.is_(True)))
+    else:
+        students = select(UserProfile.id).where(UserProfile.id.in_(set(bulk.student_ids)))
+    issued = select(Certificate.student_id).where(Certificate.course_id == bulk.course_id)
+    student_ids = (await db.scalars(students.where(students.selected_columns[0].not_in(issued)).distinct())).all()
+
+    batch = CertificateBatch(course_id=bulk.course_id, total=len(student_ids), done=0, failed=0,
+                             created_at=datetime.utcnow())
+    db.add(batch)
+    await db.flush()
+    certificate_ids = []
+    if student_ids:
+        certificate_ids = (await db.scalars(insert(Certificate).returning(Certificate.id), [
+            {'student_id': student_id, 'course_id': bulk.course_id, 'batch_id': batch.id}
+            for student_id in student_ids
+        ])).all()
+    else:
+        batch.finished_at = batch.created_at
+    await db.commit()
+    await db.refresh(batch)
+
+    certificate_queue.enqueue(certificate_ids, batch.id)
+    return batch
+
+
+@certificate_router.get('/batch/{batch_id}/', response_model=CertificateBatchSchema)
+async def certificate_batch(batch_id: int, db: AsyncSession = Depends(get_db)):
+    batch = await db.scalar(select(CertificateBatch).where(CertificateBatch.id == batch_id))
+
+    if batch is None:
+        raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+    return batch
+
+
+@certificate_router.get('/', response_model=Page[CertificateSchema])
+async def certificate_list(course_id: Optional[int] = None, student_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await paginate_list(db, Certificate, course_id=course_id, student_id=student_id)
 
 
 @certificate_router.get('/{certificate_id}/', response_model=CertificateSchema)
-async def certificate_detail(certificate_id: int, db: Session = Depends(get_db)):
-    certificate = db.query(Certificate).filter(Certificate.id == certificate_id).first()
+async def certificate_detail(certificate_id: int, db: AsyncSession = Depends(get_db)):
+    certificate = await db.scalar(select(Certificate).where(Certificate.id == certificate_id))
 
     if certificate is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
@@ -40,8 +86,8 @@ async def certificate_detail(certificate_id: int, db: Session = Depends(get_db))
 
 
 @certificate_router.put('/{certificate_id}/', response_model=CertificateSchema)
-async def exam_update(certificate_id: int, certificate: CertificateSchema, db: Session = Depends(get_db)):
-    certificate_db = db.query(Certificate).filter(Certificate.id == certificate_id).first()
+async def exam_update(certificate_id: int, certificate: CertificateSchema, db: AsyncSession = Depends(get_db)):
+    certificate_db = await db.scalar(select(Certificate).where(Certificate.id == certificate_id))
 
     if certificate_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
@@ -49,18 +95,18 @@ async def exam_update(certificate_id: int, certificate: CertificateSchema, db: S
     for certificate_key, certificate_value in certificate.dict().items():
         setattr(certificate_db, certificate_key, certificate_value)
 
-    db.commit()
-    db.refresh(certificate_db)
+    await db.commit()
+    await db.refresh(certificate_db)
     return certificate_db
 
 
 @certificate_router.delete('/{certificate_id}/')
-async def exam_delete(certificate_id: int, db: Session = Depends(get_db)):
-    certificate_db = db.query(Certificate).filter(Certificate.id == certificate_id).first()
+async def exam_delete(certificate_id: int, db: AsyncSession = Depends(get_db)):
+    certificate_db = await db.scalar(select(Certificate).where(Certificate.id == certificate_id))
 
     if certificate_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
-    db.delete(certificate_db)
-    db.commit()
+    await db.delete(certificate_db)
+    await db.commit()
     return {'message': 'This certificate is deleted'}
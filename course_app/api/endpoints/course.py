@@ -1,106 +1,269 @@
-from course_app.db.models import Course, LevelChoices
-from course_app.db.schema import CourseSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from fastapi import Depends, HTTPException, APIRouter, Query
-from sqlalchemy import asc, desc
-from fastapi_pagination import Page, add_pagination, paginate
+from course_app.db.models import Course, Review, LevelChoices, RoleChoices
+from course_app.db.schema import (CourseSchema, CourseDetailSchema, CourseCursorPageSchema, CurrentUserSchema,
+                                  CategorySchema, LessonSchema, AssignmentSchema, ExamSchema)
+from course_app.db.database import get_db
+from course_app.api.endpoints.auth import get_current_user
+from course_app.profiler import QueryBudget
+from course_app.db.search import course_search_query
+from course_app.cache import read_through, cache_delete, invalidate_tags
+from course_app.config import CACHE_TTL_COURSE_DETAIL, CACHE_TTL_COURSE_LIST, CACHE_LOCAL_TTL
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from fastapi import Depends, HTTPException, APIRouter, Query, Request
+from sqlalchemy import asc, desc, select, tuple_, func
+from sqlalchemy.orm import selectinload, joinedload, raiseload
+from fastapi_pagination import Page
+from fastapi_pagination.ext.sqlalchemy import paginate
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+import base64
+import binascii
+import json
 
 
 
 course_router = APIRouter(prefix='/course', tags=['Courses'])
 
+# поля рейтинга считаются из отзывов, клиент их не задает
+RATING_FIELDS = {'rating_count', 'avg_rating'}
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+COURSE_INCLUDES = {
+    'lessons': (Course.course_lessons, LessonSchema),
+    'assignments': (Course.course_assignments, AssignmentSchema),
+    'exams': (Course.course_exam, ExamSchema),
+}
+
+
+def course_detail_key(course_id: int, includes=()):
+    key = f'course:detail:{course_id}'
+    return f'{key}:{",".join(sorted(includes))}' if includes else key
+
+
+def course_tag(course_id: int):
+    return f'course:{course_id}'
+
+
+def parse_includes(include: Optional[str]):
+    if not include:
+        return frozenset()
+    includes = frozenset(name.strip() for name in include.split(',') if name.strip())
+    unknown = includes - COURSE_INCLUDES.keys() - {'category', 'rating'}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f'Белгисиз include: {", ".join(sorted(unknown))}')
+    return includes
+
+
+def course_list_key(request: Request):
+    return f'course:list:{urlencode(sorted(request.query_params.multi_items()))}'
+
+
+async def invalidate_course(course_id: int):
+    await cache_delete(course_detail_key(course_id))
+    await invalidate_tags(course_tag(course_id), 'course_list', 'carts')
 
 
-@course_router.get('/search', response_model=List[CourseSchema])
-async def search_course(course_name:str, db: Session = Depends(get_db)):
-    course_db = db.query(Course).filter(Course.course_name.ilike(f'%{course_name}%')).all()
-    if not course_db:
+async def invalidate_course_rating(*course_ids: int):
+    # рейтинг виден в деталях курса и в каталоге, но не в корзине - 'carts' не трогаем
+    course_ids = set(course_ids)
+    await cache_delete(*(course_detail_key(course_id) for course_id in course_ids))
+    await invalidate_tags(*(course_tag(course_id) for course_id in course_ids), 'course_list')
+
+
+async def invalidate_course_includes(*course_ids: int):
+    # уроки, задания и экзамены попадают только в ответы с include
+    await invalidate_tags(*(course_tag(course_id) for course_id in set(course_ids)))
+
+
+async def load_course_detail(db: AsyncSession, course_id: int, includes=frozenset()):
+    # один запрос на курс (категория через JOIN) и по одному selectin на каждую коллекцию;
+    # raiseload запрещает любые ленивые загрузки
+    options = [selectinload(COURSE_INCLUDES[name][0]) for name in sorted(includes & COURSE_INCLUDES.keys())]
+    if 'category' in includes:
+        options.append(joinedload(Course.category))
+    course = await db.scalar(select(Course).where(Course.id == course_id).options(*options, raiseload('*')))
+    if course is None:
+        return None
+
+    detail = CourseSchema.model_validate(course, from_attributes=True).model_dump(mode='json')
+    if 'category' in includes:
+        detail['category'] = CategorySchema.model_validate(course.category, from_attributes=True).model_dump(mode='json')
+    for name in includes & COURSE_INCLUDES.keys():
+        relationship, schema = COURSE_INCLUDES[name]
+        items = sorted(getattr(course, relationship.key), key=lambda item: item.id)
+        detail[name] = [schema.model_validate(item, from_attributes=True).model_dump(mode='json') for item in items]
+    if 'rating' in includes:
+        rows = await db.execute(select(Review.rating, func.count(Review.id))
+                                .where(Review.course_id == course_id, Review.rating.is_not(None))
+                                .group_by(Review.rating))
+        distribution = {str(value): 0 for value in range(1, 6)}
+        for rating, count in rows:
+            distribution[rating.value] = count
+        detail['rating'] = {'avg_rating': float(course.avg_rating or 0), 'rating_count': course.rating_count,
+                            'distribution': distribution}
+    return detail
+
+
+@course_router.get('/search', response_model=Page[CourseSchema])
+async def search_course(course_name: str = Query(..., min_length=1), db: AsyncSession = Depends(get_db)):
+    query = course_search_query(course_name)
+    if query is None:
         raise HTTPException(status_code=404, detail='Мындай маалымат жок')
-    return course_db
+
+    page = await paginate(db, query)
+    if not page.total:
+        raise HTTPException(status_code=404, detail='Мындай маалымат жок')
+    return page
 
 
 @course_router.post('/', response_model=CourseSchema)
-async def course_create(course: CourseSchema, db: Session = Depends(get_db)):
-    course_db = Course(**course.dict())
+async def course_create(course: CourseSchema, current_user: CurrentUserSchema = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    if current_user.role != RoleChoices.teacher:
+        raise HTTPException(status_code=403, detail='Курс кошууга укугуңуз жок')
+    course_db = Course(**{**course.dict(exclude=RATING_FIELDS), 'created_by_id': current_user.id})
     db.add(course_db)
-    db.commit()
-    db.refresh(course_db)
+    await db.commit()
+    await db.refresh(course_db)
+    await invalidate_tags('course_list')
     return course_db
 
 
+def filter_courses(query, min_price: Optional[float], max_price: Optional[float], level: Optional[LevelChoices]):
+    if min_price is not None:
+        query = query.where(Course.price >= min_price)
+
+    if max_price is not None:
+        query=query.where(Course.price <= max_price)
+
+    if level:
+        query = query.where(Course.level == level)
+
+    return query
+
+
+def encode_cursor(course: Course):
+    raw = json.dumps([str(course.price), course.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        price, course_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        price, course_id = Decimal(price), int(course_id)
+    except (ValueError, TypeError, binascii.Error, InvalidOperation):
+        raise HTTPException(status_code=400, detail='Туура эмес cursor')
+    if not price.is_finite():
+        raise HTTPException(status_code=400, detail='Туура эмес cursor')
+    return price, course_id
+
+
 @course_router.get('/', response_model=Page[CourseSchema])
-async def course_list(min_price: Optional[float] = Query(None, alias='price[from]'),
+async def course_list(request: Request,
+                      min_price: Optional[float] = Query(None, alias='price[from]'),
                       max_price: Optional[float] = Query(None, alias='price[to]'),
                       level: Optional[LevelChoices] = None,
-                      order_by: Optional[str] = Query('asc', regex='^(asc|desc)$'),
-                      db: Session = Depends(get_db)):
+                      order_by: Optional[str] = Query('asc', regex='^(asc|desc|rating)$'),
+                      db: AsyncSession = Depends(get_db)):
 
-    query = db.query(Course)
+    async def load():
+        query = filter_courses(select(Course), min_price, max_price, level)
 
-    if min_price is not None:
-        query = query.filter(Course.price >= min_price)
+        if order_by == 'asc':
+            query = query.order_by(asc(Course.price), asc(Course.id))
+        elif order_by == 'rating':
+            query = query.order_by(desc(Course.avg_rating), desc(Course.id))
+        else:
+            query = query.order_by(desc(Course.price), desc(Course.id))
 
-    if max_price is not None:
-        query=query.filter(Course.price <= max_price)
+        page = await paginate(db, query)
 
-    if level:
-        query = query.filter(Course.level == level)
+        if not page.total:
+            raise HTTPException(status_code=404, detail='Мындай маалымат жок')
+
+        return page.model_dump(mode='json')
+
+    return await read_through('course_list', course_list_key(request), CACHE_TTL_COURSE_LIST, load,
+                              tags=('course_list',))
+
+
+@course_router.get('/cursor', response_model=CourseCursorPageSchema)
+async def course_list_cursor(min_price: Optional[float] = Query(None, alias='price[from]'),
+                             max_price: Optional[float] = Query(None, alias='price[to]'),
+                             level: Optional[LevelChoices] = None,
+                             order_by: Optional[str] = Query('asc', regex='^(asc|desc)$'),
+                             cursor: Optional[str] = None,
+                             size: int = Query(50, ge=1, le=100),
+                             db: AsyncSession = Depends(get_db)):
+
+    query = filter_courses(select(Course), min_price, max_price, level)
+    position = tuple_(Course.price, Course.id)
 
     if order_by == 'asc':
-        query = query.order_by(asc(Course.price))
+        if cursor:
+            query = query.where(position > tuple_(*decode_cursor(cursor)))
+        query = query.order_by(asc(Course.price), asc(Course.id))
     else:
-        query = query.order_by(desc(Course.price))
-
+        if cursor:
+            query = query.where(position < tuple_(*decode_cursor(cursor)))
+        query = query.order_by(desc(Course.price), desc(Course.id))
 
-    courses = query.all()
+    result = await db.scalars(query.limit(size + 1))
+    courses = result.all()
 
-    if not courses:
-        raise HTTPException(status_code=404, detail='Мындай маалымат жок')
+    next_cursor = encode_cursor(courses[size - 1]) if len(courses) > size else None
+    return {'items': courses[:size], 'next_cursor': next_cursor}
 
-    return paginate(courses)
 
+@course_router.get('/{course_id}/', response_model=CourseDetailSchema, response_model_exclude_unset=True,
+                   dependencies=[Depends(QueryBudget(5))])
+async def course_detail(course_id: int,
+                        include: Optional[str] = Query(None, description='lessons,assignments,exams,category,rating'),
+                        db: AsyncSession = Depends(get_db)):
+    includes = parse_includes(include)
 
+    async def load():
+        course = await load_course_detail(db, course_id, includes)
 
-@course_router.get('/{course_id}/', response_model=CourseSchema)
-async def course_detail(course_id: int, db: Session = Depends(get_db)):
-    course = db.query(Course).filter(Course.id == course_id).first()
+        if course is None:
+            raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+        return course
 
-    if course is None:
-        raise HTTPException(status_code=400, detail='Мындай маалымат жок')
-    return course
+    return await read_through('course_detail', course_detail_key(course_id, includes), CACHE_TTL_COURSE_DETAIL, load,
+                              tags=('course_detail', course_tag(course_id)), local_ttl=CACHE_LOCAL_TTL)
 
 
 @course_router.put('/{course_id}/', response_model=CourseSchema)
-async def course_update(course_id: int, course: CourseSchema, db: Session = Depends(get_db)):
-    course_db = db.query(Course).filter(Course.id == course_id).first()
+async def course_update(course_id: int, course: CourseSchema,
+                        current_user: CurrentUserSchema = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    course_db = await db.scalar(select(Course).where(Course.id == course_id))
 
     if course_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+    if course_db.created_by_id != current_user.id:
+        raise HTTPException(status_code=403, detail='Бул курсту өзгөртүүгө укугуңуз жок')
 
-    for course_key, course_value in course.dict().items():
+    for course_key, course_value in course.dict(exclude={'id', 'created_by_id', *RATING_FIELDS}).items():
         setattr(course_db, course_key, course_value)
 
-    db.commit()
-    db.refresh(course_db)
+    await db.commit()
+    await db.refresh(course_db)
+    await invalidate_course(course_id)
     return course_db
 
 
 @course_router.delete('/{course_id}/')
-async def course_delete(course_id: int, db: Session = Depends(get_db)):
-    course_db = db.query(Course).filter(Course.id == course_id).first()
+async def course_delete(course_id: int, current_user: CurrentUserSchema = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    course_db = await db.scalar(select(Course).where(Course.id == course_id))
 
     if course_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+    if course_db.created_by_id != current_user.id:
+        raise HTTPException(status_code=403, detail='Бул курсту өчүрүүгө укугуңуз жок')
 
-    db.delete(course_db)
-    db.commit()
+    await db.delete(course_db)
+    await db.commit()
+    await invalidate_course(course_id)
     return {'message': 'This course is deleted'}
@@ -1,66 +1,207 @@
-from course_app.db.models import Exam
-from course_app.db.schema import ExamSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
-from fastapi import Depends, HTTPException, APIRouter
+from course_app.db.models import Exam, Question, Option, ExamAttempt, RoleChoices
+from course_app.db.schema import (ExamSchema, QuestionSchema, ExamFullSchema, ExamSubmitSchema, ExamAttemptSchema,
+                                  CurrentUserSchema)
+from course_app.db.database import get_db
+from course_app.api.endpoints.auth import get_current_user
+from course_app.api.endpoints.course import invalidate_course_includes
+from course_app.api.pagination import paginate_list
+from course_app.cache import read_through, cache_delete
+from course_app.config import CACHE_TTL_EXAM_KEY, CACHE_TTL_EXAM_FULL, CACHE_LOCAL_TTL
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import Optional
+from fastapi import Depends, HTTPException, APIRouter, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi_pagination import Page
 
 exam_router = APIRouter(prefix='/exam', tags=['Exams'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def exam_answer_key(exam_id: int):
+    return f'exam:answer_key:{exam_id}'
+
+
+def exam_version_key(exam_id: int):
+    return f'exam:version:{exam_id}'
+
+
+def exam_full_key(exam_id: int, version: int):
+    return f'exam:full:{exam_id}:{version}'
+
+
+async def bump_exam_version(db: AsyncSession, exam_filter):
+    result = await db.execute(update(Exam).where(exam_filter).values(version=Exam.version + 1).returning(Exam.id))
+    return result.scalars().all()
+
+
+async def invalidate_exam(*exam_ids: int):
+    # полная версия экзамена лежит под ключом с номером версии, ее удалять не нужно
+    exam_ids = set(exam_ids)
+    await cache_delete(*(exam_answer_key(exam_id) for exam_id in exam_ids),
+                       *(exam_version_key(exam_id) for exam_id in exam_ids))
+
+
+async def load_answer_key(db: AsyncSession, exam_id: int):
+    rows = (await db.execute(
+        select(Exam.passing_score, Question.id.label('question_id'), Option.id.label('option_id'), Option.is_correct)
+        .outerjoin(Question, Question.exam_id == Exam.id)
+        .outerjoin(Option, Option.question_id == Question.id)
+        .where(Exam.id == exam_id)
+    )).all()
+    if not rows:
+        return None
+
+    questions = {}
+    for row in rows:
+        if row.question_id is None:
+            continue
+        correct = questions.setdefault(str(row.question_id), [])
+        if row.is_correct:
+            correct.append(row.option_id)
+
+    passing_score = rows[0].passing_score
+    return {'passing_score': int(passing_score.value) if passing_score else 0, 'questions': questions}
+
+
+async def load_exam_full(db: AsyncSession, exam_id: int):
+    exam = await db.scalar(select(Exam).where(Exam.id == exam_id)
+                           .options(selectinload(Exam.exam_questions).selectinload(Question.question_options)))
+    if exam is None:
+        return None
+
+    payload = ExamSchema.model_validate(exam, from_attributes=True).model_dump(mode='json')
+    payload['version'] = exam.version
+    payload['questions'] = [{
+        **QuestionSchema.model_validate(question, from_attributes=True).model_dump(mode='json'),
+        'options': [{'id': option.id, 'is_correct': option.is_correct}
+                    for option in sorted(question.question_options, key=lambda option: option.id)],
+    } for question in sorted(exam.exam_questions, key=lambda question: question.id)]
+    return payload
+
+
+def strip_answers(payload: dict):
+    return {**payload, 'questions': [{**question, 'options': [{'id': option['id']} for option in question['options']]}
+                                     for question in payload['questions']]}
+
+
+def etag_matches(request: Request, etag: str):
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in (tag.strip() for tag in if_none_match.split(','))
+
+
+def grade_answers(answer_key: dict, answers: dict):
+    # ключ: question_id -> множество правильных вариантов; вопрос засчитывается,
+    # если выбран ровно этот набор
+    questions = {int(question_id): frozenset(options) for question_id, options in answer_key['questions'].items()}
+    if not answers.keys() <= questions.keys():
+        raise HTTPException(status_code=400, detail='Бул экзаменде мындай суроо жок')
+
+    correct = sum(frozenset(answers.get(question_id, ())) == options for question_id, options in questions.items())
+    total = len(questions)
+    # passing_score 1..5 - минимальная оценка по пятибалльной шкале
+    return correct, total, correct * 5 >= answer_key['passing_score'] * total
 
 
 @exam_router.post('/', response_model=ExamSchema)
-async def store_create(exam: ExamSchema, db: Session = Depends(get_db)):
+async def store_create(exam: ExamSchema, db: AsyncSession = Depends(get_db)):
     exam_db = Exam(**exam.dict())
     db.add(exam_db)
-    db.commit()
-    db.refresh(exam_db)
+    await db.commit()
+    await db.refresh(exam_db)
+    await invalidate_course_includes(exam_db.course_id)
     return exam_db
 
 
-@exam_router.get('/', response_model=List[ExamSchema])
-async def exam_list(db: Session = Depends(get_db)):
-    return db.query(Exam).all()
+@exam_router.get('/', response_model=Page[ExamSchema])
+async def exam_list(course_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await paginate_list(db, Exam, course_id=course_id)
 
 
 @exam_router.get('/{exam_id}/', response_model=ExamSchema)
-async def exam_detail(exam_id: int, db: Session = Depends(get_db)):
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+async def exam_detail(exam_id: int, db: AsyncSession = Depends(get_db)):
+    exam = await db.scalar(select(Exam).where(Exam.id == exam_id))
 
     if exam is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
     return exam
 
 
+@exam_router.get('/{exam_id}/full', response_model=ExamFullSchema)
+async def exam_full(exam_id: int, request: Request, current_user: CurrentUserSchema = Depends(get_current_user),
+                    db: AsyncSession = Depends(get_db)):
+    version = await read_through('exam_version', exam_version_key(exam_id), CACHE_TTL_EXAM_KEY,
+                                 lambda: db.scalar(select(Exam.version).where(Exam.id == exam_id)),
+                                 local_ttl=CACHE_LOCAL_TTL)
+    if version is None:
+        raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+
+    # правильные ответы видит только преподаватель, поэтому ETag зависит от роли
+    with_answers = current_user.role == RoleChoices.teacher
+    etag = f'W/"exam-{exam_id}-v{version}-{"answers" if with_answers else "public"}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache', 'Vary': 'Authorization'}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # содержимое под ключом с версией не меняется, его можно долго держать и в локальном кэше
+    payload = await read_through('exam_full', exam_full_key(exam_id, version), CACHE_TTL_EXAM_FULL,
+                                 lambda: load_exam_full(db, exam_id), local_ttl=CACHE_TTL_EXAM_FULL)
+    if payload is None:
+        raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+
+    return JSONResponse(payload if with_answers else strip_answers(payload), headers=headers)
+
+
 @exam_router.put('/{exam_id}/', response_model=ExamSchema)
-async def exam_update(exam_id: int, exam: ExamSchema, db: Session = Depends(get_db)):
-    exam_db = db.query(Exam).filter(Exam.id == exam_id).first()
+async def exam_update(exam_id: int, exam: ExamSchema, db: AsyncSession = Depends(get_db)):
+    exam_db = await db.scalar(select(Exam).where(Exam.id == exam_id))
 
     if exam_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
+    old_course_id = exam_db.course_id
     for exam_key, exam_value in exam.dict().items():
         setattr(exam_db, exam_key, exam_value)
+    await bump_exam_version(db, Exam.id == exam_id)
 
-    db.commit()
-    db.refresh(exam_db)
+    await db.commit()
+    await db.refresh(exam_db)
+    await invalidate_exam(exam_id)
+    await invalidate_course_includes(old_course_id, exam_db.course_id)
     return exam_db
 
 
+@exam_router.post('/{exam_id}/submit', response_model=ExamAttemptSchema)
+async def exam_submit(exam_id: int, submission: ExamSubmitSchema,
+                      current_user: CurrentUserSchema = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_db)):
+    answer_key = await read_through('exam_answer_key', exam_answer_key(exam_id), CACHE_TTL_EXAM_KEY,
+                                    lambda: load_answer_key(db, exam_id), local_ttl=CACHE_LOCAL_TTL)
+    if answer_key is None:
+        raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+    if not answer_key['questions']:
+        raise HTTPException(status_code=400, detail='Бул экзаменде суроолор жок')
+
+    correct, total, passed = grade_answers(answer_key, submission.answers)
+    attempt = ExamAttempt(exam_id=exam_id, student_id=current_user.id,
+                          answers={str(question_id): options for question_id, options in submission.answers.items()},
+                          correct=correct, total=total, score=round(correct * 100 / total, 2), passed=passed)
+    db.add(attempt)
+    await db.commit()
+    return attempt
+
+
 @exam_router.delete('/{exam_id}/')
-async def exam_delete(exam_id: int, db: Session = Depends(get_db)):
-    exam_db = db.query(Exam).filter(Exam.id == exam_id).first()
+async def exam_delete(exam_id: int, db: AsyncSession = Depends(get_db)):
+    exam_db = await db.scalar(select(Exam).where(Exam.id == exam_id))
 
     if exam_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
-    db.delete(exam_db)
-    db.commit()
+    await db.delete(exam_db)
+    await db.commit()
+    await invalidate_exam(exam_id)
+    await invalidate_course_includes(exam_db.course_id)
     return {'message': 'This exam is deleted'}
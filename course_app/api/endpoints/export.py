@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from course_app.db.models import Course, Review, Certificate, ExamAttempt, RoleChoices
+from course_app.db.schema import CurrentUserSchema
+from course_app.db.database import AsyncSessionLocal
+from course_app.api.endpoints.auth import get_current_user
+from course_app.config import EXPORT_BATCH_SIZE
+from sqlalchemy import select
+from typing import Optional
+from fastapi import Depends, HTTPException, APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+export_router = APIRouter(prefix='/export', tags=['Export'])
+
+
+# таблица и колонка, по которой работает инкрементальная выгрузка
+EXPORTS = {
+    'courses': (Course, Course.updated_at),
+    'reviews': (Review, Review.updated_at),
+    'certificates': (Certificate, Certificate.issued_at),
+    'exam_attempts': (ExamAttempt, ExamAttempt.submitted_at),
+}
+EXPORT_EXCLUDE = {'search_vector'}
+
+
+def export_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def csv_value(value):
+    # JSON-колонки (ответы экзамена) в CSV пишутся строкой JSON
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return export_value(value)
+
+
+async def export_partitions(query):
+    # отдельная сессия: зависимость get_db закрывается до того как ответ дочитан.
+    # yield_per включает серверный курсор, в памяти держится одна пачка строк
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield rows
+
+
+async def stream_ndjson(columns, partitions):
+    async for rows in partitions:
+        yield ''.join(json.dumps(dict(zip(columns, map(export_value, row))), ensure_ascii=False) + '\n'
+                      for row in rows)
+
+
+async def stream_csv(columns, partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+
+
+@export_router.get('/{name}')
+async def export_table(name: str, format: str = Query('ndjson', regex='^(ndjson|csv)$'),
+                       updated_since: Optional[datetime] = None,
+                       current_user: CurrentUserSchema = Depends(get_current_user)):
+    if current_user.role != RoleChoices.teacher:
+        raise HTTPException(status_code=403, detail='Маалыматты жүктөөгө укугуңуз жок')
+    if name not in EXPORTS:
+        raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+
+    model, updated_column = EXPORTS[name]
+    columns = [column for column in model.__table__.columns if column.key not in EXPORT_EXCLUDE]
+    query = select(*columns).order_by(model.id)
+    if updated_since is not None:
+        query = query.where(updated_column >= updated_since)
+
+    # время начала выгрузки - следующий updated_since для клиента
+    headers = {'X-Export-Started-At': datetime.utcnow().isoformat(),
+               'Content-Disposition': f'attachment; filename="{name}.{format}"'}
+    names = [column.key for column in columns]
+    if format == 'csv':
+        return StreamingResponse(stream_csv(names, export_partitions(query)), media_type='text/csv',
+                                 headers=headers)
+    return StreamingResponse(stream_ndjson(names, export_partitions(query)), media_type='application/x-ndjson',
+                             headers=headers)
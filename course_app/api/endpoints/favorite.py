@@ -1,24 +1,24 @@
 from fastapi import Depends, HTTPException, APIRouter
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
+from course_app.db.database import get_db
+from course_app.api.endpoints.auth import get_current_user
+from course_app.profiler import QueryBudget
+from course_app.db.bulk import conflict_insert
+from course_app.config import ITEMS_BATCH_MAX
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from course_app.db.models import FavoriteItem, Favorite, Course
-from course_app.db.schema import FavoriteSchema, FavoriteItemSchema, FavoriteItemCreateSchema
+from course_app.db.schema import (FavoriteSchema, FavoriteItemSchema, FavoriteItemCreateSchema, FavoriteItemBatchSchema,
+                                  CurrentUserSchema)
 
 
 favorite_router = APIRouter(prefix='/favorite', tags=['Favorite'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-@favorite_router.get('/', response_model=FavoriteSchema)
-async def favorite_list(user_id: int, db: Session = Depends(get_db)):
-    favorite = db.query(Favorite).filter(Favorite.id == user_id).first()
+@favorite_router.get('/', response_model=FavoriteSchema, dependencies=[Depends(QueryBudget(3))])
+async def favorite_list(current_user: CurrentUserSchema = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    favorite = await db.scalar(select(Favorite).where(Favorite.user_id == current_user.id)
+                               .options(selectinload(Favorite.fav_items)))
 
     if not favorite:
         raise HTTPException(status_code=404, detail='избранный не нвйден')
@@ -27,44 +27,78 @@ async def favorite_list(user_id: int, db: Session = Depends(get_db)):
 
 
 @favorite_router.post('/', response_model=FavoriteItemSchema)
-async def favorite_add(item_data: FavoriteItemCreateSchema, user_id: int, db: Session = Depends(get_db)):
-    favorite = db.query(Favorite).filter(Favorite.id == user_id).first()
+async def favorite_add(item_data: FavoriteItemCreateSchema, current_user: CurrentUserSchema = Depends(get_current_user),
+                       db: AsyncSession = Depends(get_db)):
+    favorite = await db.scalar(select(Favorite).where(Favorite.user_id == current_user.id))
 
     if not favorite:
-        favorite = Favorite(user_id=user_id)
+        favorite = Favorite(user_id=current_user.id)
         db.add(favorite)
-        db.commit()
-        db.refresh(favorite)
+        await db.commit()
+        await db.refresh(favorite)
 
-    course = db.query(Course).filter(Course.id == item_data.course_id).first()
+    course = await db.scalar(select(Course).where(Course.id == item_data.course_id))
     if not course:
         raise HTTPException(status_code=404, detail='курс не найден')
 
-    course_item = db.query(FavoriteItem).filter(FavoriteItem.fav_id == favorite.id,
-                                            FavoriteItem.course_id == item_data.course_id).first()
+    course_item = await db.scalar(select(FavoriteItem).where(FavoriteItem.fav_id == favorite.id,
+                                                             FavoriteItem.course_id == item_data.course_id))
 
     if course_item:
         raise HTTPException(status_code=404, detail='курс уже в избранный ')
 
     favorite_item = FavoriteItem(fav_id=favorite.id, course_id=item_data.course_id)
     db.add(favorite_item)
-    db.commit()
-    db.refresh(favorite_item)
+    await db.commit()
+    await db.refresh(favorite_item)
 
     return favorite_item
 
 
+@favorite_router.post('/items:batch', response_model=FavoriteSchema, dependencies=[Depends(QueryBudget(6))])
+async def favorite_add_batch(items: FavoriteItemBatchSchema,
+                             current_user: CurrentUserSchema = Depends(get_current_user),
+                             db: AsyncSession = Depends(get_db)):
+    course_ids = list(dict.fromkeys(items.course_ids))
+    if len(course_ids) > ITEMS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f'Бир жолу {ITEMS_BATCH_MAX} курстан ашпашы керек')
+
+    # все курсы проверяются одним IN-запросом
+    if course_ids:
+        found = set((await db.scalars(select(Course.id).where(Course.id.in_(course_ids)))).all())
+        missing = [course_id for course_id in course_ids if course_id not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f'курс не найден: {", ".join(map(str, missing))}')
+
+    favorite_id = await db.scalar(select(Favorite.id).where(Favorite.user_id == current_user.id))
+    if favorite_id is None:
+        favorite_id = await db.scalar(insert(Favorite).values(user_id=current_user.id).returning(Favorite.id))
+
+    # курсы, которые уже в избранном, пропускаются
+    if course_ids:
+        await db.execute(
+            conflict_insert(db, FavoriteItem).values([{'fav_id': favorite_id, 'course_id': course_id}
+                                                      for course_id in course_ids])
+            .on_conflict_do_nothing(index_elements=[FavoriteItem.fav_id, FavoriteItem.course_id])
+        )
+    await db.commit()
+
+    return await db.scalar(select(Favorite).where(Favorite.id == favorite_id)
+                           .options(selectinload(Favorite.fav_items)))
+
+
 @favorite_router.delete('/{favorite_id')
-async def favorite_delete(course_id: int, user_id: int, db: Session = Depends(get_db)):
-    favorite = db.query(Favorite).filter(Favorite.user_id == user_id).first()
+async def favorite_delete(course_id: int, current_user: CurrentUserSchema = Depends(get_current_user),
+                          db: AsyncSession = Depends(get_db)):
+    favorite = await db.scalar(select(Favorite).where(Favorite.user_id == current_user.id))
 
     if not favorite:
         raise HTTPException(status_code=404, detail='избранный не найден')
 
-    favorite_items = db.query(FavoriteItem).filter(FavoriteItem.fav_id == favorite.id, FavoriteItem.course_id == course_id).first()
+    favorite_items = await db.scalar(select(FavoriteItem).where(FavoriteItem.fav_id == favorite.id, FavoriteItem.course_id == course_id))
     if not favorite_items:
         raise HTTPException(status_code=404, detail='курс отсутсвует в корзине')
 
-    db.delete(favorite_items)
-    db.commit()
+    await db.delete(favorite_items)
+    await db.commit()
     return {'Курс удален из избранного'}
\ No newline at end of file
@@ -0,0 +1,35 @@
+import io
+from course_app.db.models import RoleChoices
+from course_app.db.schema import CurrentUserSchema
+from course_app.db.database import get_db
+from course_app.api.endpoints.auth import get_current_user
+from course_app.importer import IMPORTS, detect_format, nullable_fields, read_records, import_records
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from fastapi import Depends, HTTPException, APIRouter, Query, UploadFile
+
+import_router = APIRouter(prefix='/import', tags=['Import'])
+
+
+@import_router.post('/{name}')
+async def import_table(name: str, file: UploadFile, format: Optional[str] = Query(None, regex='^(csv|ndjson|json)$'),
+                       current_user: CurrentUserSchema = Depends(get_current_user),
+                       db: AsyncSession = Depends(get_db)):
+    if current_user.role != RoleChoices.teacher:
+        raise HTTPException(status_code=403, detail='Маалымат жүктөөгө укугуңуз жок')
+    if name not in IMPORTS:
+        raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+    file_format = format or detect_format(file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail='Файлдын форматы белгисиз')
+
+    # загруженный файл уже лежит во временном файле, записи читаются из него по одной
+    text = io.TextIOWrapper(file.file, encoding='utf-8-sig', newline='')
+    try:
+        records = read_records(text, file_format, nullable_fields(IMPORTS[name][1]))
+        return await import_records(db, name, records, current_user)
+    except (ValueError, UnicodeDecodeError) as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f'Файлды окууда ката: {e}')
+    finally:
+        text.detach()
@@ -1,38 +1,35 @@
 from course_app.db.models import Lesson
 from course_app.db.schema import LessonSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
+from course_app.db.database import get_db
+from course_app.api.pagination import paginate_list
+from course_app.api.endpoints.course import invalidate_course_includes
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from fastapi import Depends, HTTPException, APIRouter
+from fastapi_pagination import Page
 
 lesson_router = APIRouter(prefix='/lesson', tags=['Lessons'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @lesson_router.post('/', response_model=LessonSchema)
-async def lesson_create(lesson: LessonSchema, db: Session = Depends(get_db)):
+async def lesson_create(lesson: LessonSchema, db: AsyncSession = Depends(get_db)):
     lesson_db = Lesson(**lesson.dict())
     db.add(lesson_db)
-    db.commit()
-    db.refresh(lesson_db)
+    await db.commit()
+    await db.refresh(lesson_db)
+    await invalidate_course_includes(lesson_db.course_id)
     return lesson_db
 
 
-@lesson_router.get('/', response_model=List[LessonSchema])
-async def lesson_list(db: Session = Depends(get_db)):
-    return db.query(Lesson).all()
+@lesson_router.get('/', response_model=Page[LessonSchema])
+async def lesson_list(course_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await paginate_list(db, Lesson, course_id=course_id)
 
 
 @lesson_router.get('/{lesson_id}/', response_model=LessonSchema)
-async def lesson_detail(lesson_id: int, db: Session = Depends(get_db)):
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
+async def lesson_detail(lesson_id: int, db: AsyncSession = Depends(get_db)):
+    lesson = await db.scalar(select(Lesson).where(Lesson.id == lesson_id))
 
     if lesson is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
@@ -40,27 +37,30 @@ async def lesson_detail(lesson_id: int, db: Session = Depends(get_db)):
 
 
 @lesson_router.put('/{lesson_id}/', response_model=LessonSchema)
-async def lesson_update(lesson_id: int, lesson: LessonSchema, db: Session = Depends(get_db)):
-    lesson_db = db.query(Lesson).filter(Lesson.id == lesson_id).first()
+async def lesson_update(lesson_id: int, lesson: LessonSchema, db: AsyncSession = Depends(get_db)):
+    lesson_db = await db.scalar(select(Lesson).where(Lesson.id == lesson_id))
 
     if lesson_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
+    old_course_id = lesson_db.course_id
     for lesson_key, lesson_value in lesson.dict().items():
         setattr(lesson_db, lesson_key, lesson_value)
 
-    db.commit()
-    db.refresh(lesson_db)
+    await db.commit()
+    await db.refresh(lesson_db)
+    await invalidate_course_includes(old_course_id, lesson_db.course_id)
     return lesson_db
 
 
 @lesson_router.delete('/{lesson_id}/')
-async def lesson_delete(lesson_id: int, db: Session = Depends(get_db)):
-    lesson_db = db.query(Lesson).filter(Lesson.id == lesson_id).first()
+async def lesson_delete(lesson_id: int, db: AsyncSession = Depends(get_db)):
+    lesson_db = await db.scalar(select(Lesson).where(Lesson.id == lesson_id))
 
     if lesson_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
-    db.delete(lesson_db)
-    db.commit()
+    await db.delete(lesson_db)
+    await db.commit()
+    await invalidate_course_includes(lesson_db.course_id)
     return {'message': 'This lesson is deleted'}
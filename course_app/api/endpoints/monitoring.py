@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from course_app.db.database import engine, async_engine, pool_stats, pool_status
+from course_app.cache import cache_stats
+from course_app.metrics import render_metrics
+
+
+monitoring_router = APIRouter(prefix='/monitoring', tags=['Monitoring'])
+metrics_router = APIRouter(tags=['Monitoring'])
+
+
+@monitoring_router.get('/db-pool')
+async def db_pool_metrics():
+    return {
+        'api': {**pool_status(async_engine.sync_engine), **pool_stats.as_dict()},
+        'admin': pool_status(engine),
+    }
+
+
+@monitoring_router.get('/cache')
+async def cache_metrics():
+    return cache_stats.as_dict()
+
+
+@metrics_router.get('/metrics', response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,38 +1,41 @@
-from course_app.db.models import Option
+from course_app.db.models import Option, Question, Exam
 from course_app.db.schema import OptionSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
+from course_app.db.database import get_db
+from course_app.api.pagination import paginate_list
+from course_app.api.endpoints.exam import invalidate_exam, bump_exam_version
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from fastapi import Depends, HTTPException, APIRouter
+from fastapi_pagination import Page
 
 option_router = APIRouter(prefix='/option', tags=['Options'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def bump_option_exams(db: AsyncSession, *question_ids: int):
+    exam_ids = select(Question.exam_id).where(Question.id.in_(set(question_ids)))
+    return await bump_exam_version(db, Exam.id.in_(exam_ids))
 
 
 @option_router.post('/', response_model=OptionSchema)
-async def option_create(option: OptionSchema, db: Session = Depends(get_db)):
+async def option_create(option: OptionSchema, db: AsyncSession = Depends(get_db)):
     option_db = Option(**option.dict())
     db.add(option_db)
-    db.commit()
-    db.refresh(option_db)
+    exam_ids = await bump_option_exams(db, option_db.question_id)
+    await db.commit()
+    await db.refresh(option_db)
+    await invalidate_exam(*exam_ids)
     return option_db
 
 
-@option_router.get('/', response_model=List[OptionSchema])
-async def option_list(db: Session = Depends(get_db)):
-    return db.query(Option).all()
+@option_router.get('/', response_model=Page[OptionSchema])
+async def option_list(question_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await paginate_list(db, Option, question_id=question_id)
 
 
 @option_router.get('/{option_id}/', response_model=OptionSchema)
-async def option_detail(option_id: int, db: Session = Depends(get_db)):
-    option = db.query(Option).filter(Option.id == option_id).first()
+async def option_detail(option_id: int, db: AsyncSession = Depends(get_db)):
+    option = await db.scalar(select(Option).where(Option.id == option_id))
 
     if option is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
@@ -40,27 +43,32 @@ async def option_detail(option_id: int, db: Session = Depends(get_db)):
 
 
 @option_router.put('/{option_id}/', response_model=OptionSchema)
-async def option_update(option_id: int, option: OptionSchema, db: Session = Depends(get_db)):
-    option_db = db.query(Option).filter(Option.id == option_id).first()
+async def option_update(option_id: int, option: OptionSchema, db: AsyncSession = Depends(get_db)):
+    option_db = await db.scalar(select(Option).where(Option.id == option_id))
 
     if option_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
+    old_question_id = option_db.question_id
     for option_key, option_value in option.dict().items():
         setattr(option_db, option_key, option_value)
+    exam_ids = await bump_option_exams(db, old_question_id, option_db.question_id)
 
-    db.commit()
-    db.refresh(option_db)
+    await db.commit()
+    await db.refresh(option_db)
+    await invalidate_exam(*exam_ids)
     return option_db
 
 
 @option_router.delete('/{option_id}/')
-async def option_delete(option_id: int, db: Session = Depends(get_db)):
-    option_db = db.query(Option).filter(Option.id == option_id).first()
+async def option_delete(option_id: int, db: AsyncSession = Depends(get_db)):
+    option_db = await db.scalar(select(Option).where(Option.id == option_id))
 
     if option_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
-    db.delete(option_db)
-    db.commit()
+    await db.delete(option_db)
+    exam_ids = await bump_option_exams(db, option_db.question_id)
+    await db.commit()
+    await invalidate_exam(*exam_ids)
     return {'message': 'This option is deleted'}
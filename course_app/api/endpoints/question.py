@@ -1,38 +1,36 @@
-from course_app.db.models import Question
+from course_app.db.models import Question, Exam
 from course_app.db.schema import QuestionSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
+from course_app.db.database import get_db
+from course_app.api.pagination import paginate_list
+from course_app.api.endpoints.exam import invalidate_exam, bump_exam_version
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from fastapi import Depends, HTTPException, APIRouter
+from fastapi_pagination import Page
 
 question_router = APIRouter(prefix='/question', tags=['Questions'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @question_router.post('/', response_model=QuestionSchema)
-async def question_create(question: QuestionSchema, db: Session = Depends(get_db)):
+async def question_create(question: QuestionSchema, db: AsyncSession = Depends(get_db)):
     question_db = Question(**question.dict())
     db.add(question_db)
-    db.commit()
-    db.refresh(question_db)
+    await bump_exam_version(db, Exam.id == question_db.exam_id)
+    await db.commit()
+    await db.refresh(question_db)
+    await invalidate_exam(question_db.exam_id)
     return question_db
 
 
-@question_router.get('/', response_model=List[QuestionSchema])
-async def question_list(db: Session = Depends(get_db)):
-    return db.query(Question).all()
+@question_router.get('/', response_model=Page[QuestionSchema])
+async def question_list(exam_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await paginate_list(db, Question, exam_id=exam_id)
 
 
 @question_router.get('/{question_id}/', response_model=QuestionSchema)
-async def exam_detail(question_id: int, db: Session = Depends(get_db)):
-    question = db.query(Question).filter(Question.id == question_id).first()
+async def exam_detail(question_id: int, db: AsyncSession = Depends(get_db)):
+    question = await db.scalar(select(Question).where(Question.id == question_id))
 
     if question is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
@@ -40,27 +38,32 @@ async def exam_detail(question_id: int, db: Session = Depends(get_db)):
 
 
 @question_router.put('/{question_id}/', response_model=QuestionSchema)
-async def question_update(question_id: int, question: QuestionSchema, db: Session = Depends(get_db)):
-    question_db = db.query(Question).filter(Question.id == question_id).first()
+async def question_update(question_id: int, question: QuestionSchema, db: AsyncSession = Depends(get_db)):
+    question_db = await db.scalar(select(Question).where(Question.id == question_id))
 
     if question_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
+    old_exam_id = question_db.exam_id
     for question_key, question_value in question.dict().items():
         setattr(question_db, question_key, question_value)
+    await bump_exam_version(db, Exam.id.in_({old_exam_id, question_db.exam_id}))
 
-    db.commit()
-    db.refresh(question_db)
+    await db.commit()
+    await db.refresh(question_db)
+    await invalidate_exam(old_exam_id, question_db.exam_id)
     return question_db
 
 
 @question_router.delete('/{question_id}/')
-async def question_delete(question_id: int, db: Session = Depends(get_db)):
-    question_db = db.query(Question).filter(Question.id == question_id).first()
+async def question_delete(question_id: int, db: AsyncSession = Depends(get_db)):
+    question_db = await db.scalar(select(Question).where(Question.id == question_id))
 
     if question_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
 
-    db.delete(question_db)
-    db.commit()
+    await db.delete(question_db)
+    await bump_exam_version(db, Exam.id == question_db.exam_id)
+    await db.commit()
+    await invalidate_exam(question_db.exam_id)
     return {'message': 'This question is deleted'}
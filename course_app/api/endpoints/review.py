@@ -1,38 +1,39 @@
 from course_app.db.models import Review
-from course_app.db.schema import ReviewSchema
-from course_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
+from course_app.db.schema import ReviewSchema, CurrentUserSchema
+from course_app.db.database import get_db
+from course_app.api.endpoints.auth import get_current_user
+from course_app.api.endpoints.course import invalidate_course_rating
+from course_app.ratings import apply_rating
+from course_app.api.pagination import paginate_list
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from fastapi import Depends, HTTPException, APIRouter
+from fastapi_pagination import Page
 
 review_router = APIRouter(prefix='/review', tags=['Reviews'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @review_router.post('/', response_model=ReviewSchema)
-async def review_create(review: ReviewSchema, db: Session = Depends(get_db)):
-    review_db = Review(**review.dict())
+async def review_create(review: ReviewSchema, current_user: CurrentUserSchema = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    review_db = Review(**{**review.dict(), 'user_id': current_user.id})
     db.add(review_db)
-    db.commit()
-    db.refresh(review_db)
+    await apply_rating(db, review_db.course_id, review_db.rating, 1)
+    await db.commit()
+    await db.refresh(review_db)
+    await invalidate_course_rating(review_db.course_id)
     return review_db
 
 
-@review_router.get('/', response_model=List[ReviewSchema])
-async def review_list(db: Session = Depends(get_db)):
-    return db.query(Review).all()
+@review_router.get('/', response_model=Page[ReviewSchema])
+async def review_list(course_id: Optional[int] = None, user_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await paginate_list(db, Review, course_id=course_id, user_id=user_id)
 
 
 @review_router.get('/{review_id}/', response_model=ReviewSchema)
-async def review_detail(review_id: int, db: Session = Depends(get_db)):
-    review = db.query(Review).filter(Review.id == review_id).first()
+async def review_detail(review_id: int, db: AsyncSession = Depends(get_db)):
+    review = await db.scalar(select(Review).where(Review.id == review_id))
 
     if review is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
@@ -40,27 +41,40 @@ async def review_detail(review_id: int, db: Session = Depends(get_db)):
 
 
 @review_router.put('/{review_id}/', response_model=ReviewSchema)
-async def review_update(review_id: int, review: ReviewSchema, db: Session = Depends(get_db)):
-    review_db = db.query(Review).filter(Review.id == review_id).first()
+async def review_update(review_id: int, review: ReviewSchema,
+                        current_user: CurrentUserSchema = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    review_db = await db.scalar(select(Review).where(Review.id == review_id))
 
     if review_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+    if review_db.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail='Бул пикирди өзгөртүүгө укугуңуз жок')
 
-    for review_key, review_value in review.dict().items():
+    old_course_id = review_db.course_id
+    await apply_rating(db, old_course_id, review_db.rating, -1)
+    for review_key, review_value in review.dict(exclude={'id', 'user_id'}).items():
         setattr(review_db, review_key, review_value)
+    await apply_rating(db, review_db.course_id, review_db.rating, 1)
 
-    db.commit()
-    db.refresh(review_db)
+    await db.commit()
+    await db.refresh(review_db)
+    await invalidate_course_rating(old_course_id, review_db.course_id)
     return review_db
 
 
 @review_router.delete('/{review_id}/')
-async def review_delete(review_id: int, db: Session = Depends(get_db)):
-    review_db = db.query(Review).filter(Review.id == review_id).first()
+async def review_delete(review_id: int, current_user: CurrentUserSchema = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    review_db = await db.scalar(select(Review).where(Review.id == review_id))
 
     if review_db is None:
         raise HTTPException(status_code=400, detail='Мындай маалымат жок')
+    if review_db.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail='Бул пикирди өчүрүүгө укугуңуз жок')
 
-    db.delete(review_db)
-    db.commit()
+    await db.delete(review_db)
+    await apply_rating(db, review_db.course_id, review_db.rating, -1)
+    await db.commit()
+    await invalidate_course_rating(review_db.course_id)
     return {'message': 'This store is deleted'}
@@ -0,0 +1,11 @@
+from fastapi_pagination.ext.sqlalchemy import paginate
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def paginate_list(db: AsyncSession, model, **filters):
+    query = select(model)
+    for column, value in filters.items():
+        if value is not None:
+            query = query.where(getattr(model, column) == value)
+    return await paginate(db, query.order_by(model.id))
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from redis.exceptions import RedisError
+from course_app.config import CACHE_LOCAL_MAXSIZE, AUTH_CACHE_MAXSIZE
+
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+redis_client = None
+
+
+def init_cache(client):
+    global redis_client
+    redis_client = client
+
+
+class CacheStats:
+    def __init__(self):
+        self.counters = defaultdict(lambda: {'hits': 0, 'local_hits': 0, 'misses': 0, 'coalesced': 0})
+
+    def hit(self, namespace: str):
+        self.counters[namespace]['hits'] += 1
+
+    def local_hit(self, namespace: str):
+        self.counters[namespace]['local_hits'] += 1
+
+    def miss(self, namespace: str):
+        self.counters[namespace]['misses'] += 1
+
+    def coalesced(self, namespace: str):
+        self.counters[namespace]['coalesced'] += 1
+
+    def as_dict(self):
+        result = {}
+        for namespace, counter in self.counters.items():
+            hits = counter['hits'] + counter['local_hits'] + counter['coalesced']
+            total = hits + counter['misses']
+            result[namespace] = {**counter, 'hit_ratio': round(hits / total, 3) if total else 0.0}
+        return result
+
+
+cache_stats = CacheStats()
+
+
+class LocalCache:
+    """Bounded per-worker LRU with per-entry TTL, sitting in front of Redis."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, tags = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float, tags=()):
+        self.entries[key] = (value, time.monotonic() + ttl, frozenset(tags))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def evict(self, keys=(), tags=()):
+        for key in keys:
+            self.entries.pop(key, None)
+        if tags:
+            tags = set(tags)
+            for key in [key for key, (_, _, entry_tags) in self.entries.items() if entry_tags & tags]:
+                del self.entries[key]
+
+
+local_cache = LocalCache(CACHE_LOCAL_MAXSIZE)
+# токены и пользователи в своем LRU: их много, и они не должны вытеснять горячие ключи каталога
+auth_cache = LocalCache(AUTH_CACHE_MAXSIZE)
+LOCAL_CACHES = (local_cache, auth_cache)
+
+# результат future, когда лидер отменен и ожидающим нужно загрузить ключ заново
+RETRY = object()
+
+
+class InflightLoad:
+    def __init__(self, tags=()):
+        self.future = asyncio.get_running_loop().create_future()
+        self.tags = frozenset(tags)
+        # растет при каждой инвалидации ключа или его тега, пока идет загрузка
+        self.generation = 0
+
+
+inflight = {}
+
+
+def evict_local(keys=(), tags=()):
+    for local in LOCAL_CACHES:
+        local.evict(keys, tags)
+    keys, tags = set(keys), set(tags)
+    for key, load in inflight.items():
+        if key in keys or load.tags & tags:
+            load.generation += 1
+
+
+def tag_key(tag: str):
+    return f'tag:{tag}'
+
+
+async def publish_invalidation(keys=(), tags=()):
+    evict_local(keys, tags)
+    if redis_client is None:
+        return
+    try:
+        await redis_client.publish(INVALIDATION_CHANNEL, json.dumps({'keys': list(keys), 'tags': list(tags)}))
+    except RedisError as e:
+        logger.warning('cache publish failed: %s', e)
+
+
+async def listen_invalidations(client):
+    while True:
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                data = json.loads(message['data'])
+                evict_local(data.get('keys', ()), data.get('tags', ()))
+        except RedisError as e:
+            logger.warning('cache invalidation listener failed: %s', e)
+            # пока слушатель не работает, локальные записи могли устареть
+            for local in LOCAL_CACHES:
+                local.entries.clear()
+            for load in inflight.values():
+                load.generation += 1
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+
+async def cache_get(key: str):
+    if redis_client is None:
+        return None
+    try:
+        raw = await redis_client.get(key)
+    except RedisError as e:
+        logger.warning('cache get %s failed: %s', key, e)
+        return None
+    return json.loads(raw) if raw is not None else None
+
+
+async def cache_set(key: str, value, ttl: int, tags=()):
+    if redis_client is None:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(key, json.dumps(value, default=str), ex=ttl)
+            for tag in tags:
+                pipe.sadd(tag_key(tag), key)
+                pipe.expire(tag_key(tag), ttl)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning('cache set %s failed: %s', key, e)
+
+
+async def cache_delete(*keys: str):
+    if not keys:
+        return
+    await publish_invalidation(keys=keys)
+    if redis_client is None:
+        return
+    try:
+        await redis_client.delete(*keys)
+    except RedisError as e:
+        logger.warning('cache delete %s failed: %s', keys, e)
+
+
+async def invalidate_tags(*tags: str):
+    if not tags:
+        return
+    await publish_invalidation(tags=tags)
+    if redis_client is None:
+        return
+    try:
+        keys = set()
+        for tag in tags:
+            keys.update(await redis_client.smembers(tag_key(tag)))
+        await redis_client.delete(*keys, *(tag_key(tag) for tag in tags))
+    except RedisError as e:
+        logger.warning('cache invalidate %s failed: %s', tags, e)
+
+
+async def read_through(namespace: str, key: str, ttl: int, loader, tags=(), local_ttl: float = 0,
+                       local: LocalCache = local_cache):
+    while True:
+        if local_ttl:
+            value = local.get(key)
+            if value is not None:
+                cache_stats.local_hit(namespace)
+                return value
+
+        # single-flight: пока один запрос грузит ключ, остальные ждут его результат
+        load = inflight.get(key)
+        if load is None:
+            break
+        cache_stats.coalesced(namespace)
+        value = await asyncio.shield(load.future)
+        if value is not RETRY:
+            return value
+
+    load = InflightLoad(tags)
+    future = load.future
+    inflight[key] = load
+    try:
+        value = await cache_get(key)
+        if value is not None:
+            cache_stats.hit(namespace)
+        else:
+            cache_stats.miss(namespace)
+            value = await loader()
+            # ключ инвалидировали, пока loader читал базу: значение могло устареть, в кэш его не кладем
+            if load.generation == 0:
+                await cache_set(key, value, ttl, tags)
+
+        if local_ttl and load.generation == 0:
+            local.set(key, value, min(local_ttl, ttl), tags)
+        future.set_result(value)
+        return value
+    except Exception as e:
+        future.set_exception(e)
+        # исключение уже передано ожидающим, само future больше никто не читает
+        future.exception()
+        raise
+    except BaseException:
+        # лидера отменили (клиент отключился): ожидающие живы и грузят ключ сами
+        future.set_result(RETRY)
+        raise
+    finally:
+        inflight.pop(key, None)
@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from jinja2 import Environment
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
+from course_app.config import (CERTIFICATE_STORAGE_DIR, CERTIFICATE_BASE_URL, CERTIFICATE_WORKERS,
+                               CERTIFICATE_BATCH_SIZE)
+from course_app.db.database import AsyncSessionLocal
+from course_app.db.models import Certificate, CertificateBatch, Course, UserProfile
+from course_app.mailer import email_queue
+
+
+logger = logging.getLogger(__name__)
+
+CERTIFICATE_TEMPLATE = Environment(autoescape=True).from_string('''\
+<svg xmlns="http://www.w3.org/2000/svg" width="1123" height="794" viewBox="0 0 1123 794">
+  <rect x="20" y="20" width="1083" height="754" fill="#fff" stroke="#1f3a5f" stroke-width="8"/>
+  <text x="561" y="190" font-family="Arial, sans-serif" font-size="64" text-anchor="middle" fill="#1f3a5f">Сертификат</text>
+  <text x="561" y="300" font-family="Arial, sans-serif" font-size="28" text-anchor="middle">Бул сертификат берилди</text>
+  <text x="561" y="390" font-family="Arial, sans-serif" font-size="48" text-anchor="middle" font-weight="bold">{{ student }}</text>
+  <text x="561" y="470" font-family="Arial, sans-serif" font-size="28" text-anchor="middle">курсту ийгиликтүү аяктагандыгы үчүн:</text>
+  <text x="561" y="540" font-family="Arial, sans-serif" font-size="36" text-anchor="middle">{{ course }}</text>
+  <text x="120" y="700" font-family="Arial, sans-serif" font-size="22">{{ issued_at }}</text>
+  <text x="1003" y="700" font-family="Arial, sans-serif" font-size="22" text-anchor="end">№ {{ certificate_id }}</text>
+</svg>
+''')
+
+
+def render_certificate(data: dict):
+    # выполняется в отдельном процессе, поэтому принимает и возвращает только простые типы
+    return CERTIFICATE_TEMPLATE.render(**data).encode()
+
+
+class LocalStorage:
+    def __init__(self, directory: str, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip('/')
+
+    def save(self, content: bytes, extension: str):
+        # имя файла - хэш содержимого: повторная генерация того же документа ничего не пишет
+        name = f'{hashlib.sha256(content).hexdigest()}.{extension}'
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        return f'{self.base_url}/{name}'
+
+
+class CertificateQueue:
+    def __init__(self, storage, workers: int = CERTIFICATE_WORKERS, batch_size: int = CERTIFICATE_BATCH_SIZE):
+        self.storage = storage
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = asyncio.Queue()
+        self.executor = None
+        self.task = None
+
+    def enqueue(self, certificate_ids, batch_id: int = None):
+        for certificate_id in certificate_ids:
+            self.queue.put_nowait((certificate_id, batch_id))
+
+    async def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self.task = asyncio.create_task(self._worker())
+        await self.requeue()
+
+    async def requeue(self):
+        # очередь живет в памяти процесса: после остановки или перезапуска задания восстанавливаются из базы.
+        # у неудачных сертификатов batch_id обнуляется, поэтому повтор не засчитывается в пачку второй раз
+        try:
+            async with AsyncSessionLocal() as db:
+                jobs = (await db.execute(select(Certificate.id, Certificate.batch_id)
+                                         .where(Certificate.certificate_url.is_(None))
+                                         .order_by(Certificate.id))).all()
+        except SQLAlchemyError as e:
+            logger.error('unfinished certificates were not requeued: %s', e)
+            return
+        for certificate_id, batch_id in jobs:
+            self.queue.put_nowait((certificate_id, batch_id))
+        if jobs:
+            logger.info('requeued %s unfinished certificates', len(jobs))
+
+    async def stop(self, timeout: float = 10):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if not self.queue.empty():
+            logger.warning('certificate queue stopped with %s pending jobs', self.queue.qsize())
+
+    async def _worker(self):
+        while True:
+            jobs = [await self.queue.get()]
+            while len(jobs) < self.batch_size and not self.queue.empty():
+                jobs.append(self.queue.get_nowait())
+            try:
+                await self.process(jobs)
+            except Exception:
+                # воркер один: любая ошибка пачки не должна останавливать очередь
+                logger.exception('certificate batch of %s failed', len(jobs))
+                await self.fail(jobs)
+            finally:
+                for _ in jobs:
+                    self.queue.task_done()
+
+    @staticmethod
+    async def update_batch(db, batch_id: int, done: int, failed: int):
+        await db.execute(update(CertificateBatch).where(CertificateBatch.id == batch_id).values(
+            done=CertificateBatch.done + done, failed=CertificateBatch.failed + failed))
+        await db.execute(update(CertificateBatch).where(
+            CertificateBatch.id == batch_id,
+            CertificateBatch.done + CertificateBatch.failed >= CertificateBatch.total,
+        ).values(finished_at=datetime.utcnow()))
+
+    @staticmethod
+    async def detach(db, certificate_ids):
+        # засчитанный в пачку неудачный сертификат отвязывается от нее: повтор после перезапуска ее не меняет
+        if certificate_ids:
+            await db.execute(update(Certificate).where(Certificate.id.in_(certificate_ids),
+                                                       Certificate.certificate_url.is_(None)).values(batch_id=None))
+
+    async def fail(self, jobs):
+        # пачка не обработана: ее задания засчитываются как неудачные, чтобы прогресс дошел до конца
+        totals = Counter(batch_id for _, batch_id in jobs if batch_id is not None)
+        if not totals:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                for batch_id, total in totals.items():
+                    await self.update_batch(db, batch_id, 0, total)
+                await self.detach(db, [certificate_id for certificate_id, batch_id in jobs if batch_id is not None])
+                await db.commit()
+        except SQLAlchemyError as e:
+            logger.error('certificate batch progress was not saved: %s', e)
+
+    async def process(self, jobs):
+        batch_ids = dict(jobs)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Certificate.id, Certificate.issued_at, Certificate.certificate_url, UserProfile.first_name,
+                       UserProfile.last_name, UserProfile.email, Course.course_name)
+                .join(UserProfile, UserProfile.id == Certificate.student_id)
+                .join(Course, Course.id == Certificate.course_id)
+                .where(Certificate.id.in_(batch_ids))
+            )).all()
+            # восстановленное после перезапуска задание могло быть уже выполнено: такие не трогаем и не считаем
+            finished = {row.id for row in rows if row.certificate_url}
+            rows = [row for row in rows if not row.certificate_url]
+
+            loop = asyncio.get_running_loop()
+            documents = await asyncio.gather(*(loop.run_in_executor(self.executor, render_certificate, {
+                'certificate_id': row.id,
+                'student': f'{row.first_name} {row.last_name}',
+                'course': row.course_name,
+                'issued_at': (row.issued_at or datetime.utcnow()).strftime('%d.%m.%Y'),
+            }) for row in rows), return_exceptions=True)
+
+            rendered, urls, failed = [], [], []
+            for row, document in zip(rows, documents):
+                if isinstance(document, Exception):
+                    logger.error('certificate %s rendering failed: %s', row.id, document)
+                    failed.append(row.id)
+                    continue
+                url = await asyncio.to_thread(self.storage.save, document, 'svg')
+                urls.append({'id': row.id, 'certificate_url': url})
+                rendered.append(row)
+
+            if urls:
+                await db.execute(update(Certificate), urls)
+            await self.detach(db, [certificate_id for certificate_id in failed if batch_ids[certificate_id]])
+
+            # прогресс пачки: неотрисованные и удаленные сертификаты считаются неудачными
+            done = Counter(batch_ids[row.id] for row in rendered)
+            totals = Counter(batch_id for certificate_id, batch_id in batch_ids.items() if certificate_id not in finished)
+            for batch_id, total in totals.items():
+                if batch_id is None:
+                    continue
+                await self.update_batch(db, batch_id, done[batch_id], total - done[batch_id])
+            await db.commit()
+
+        for row, url in zip(rendered, urls):
+            if row.email:
+                email_queue.send(row.email, 'Сертификат даяр',
+                                 f'Саламатсызбы, {row.first_name}! "{row.course_name}" курсу боюнча сертификат '
+                                 f'берилди.\n{url["certificate_url"]}')
+
+
+certificate_queue = CertificateQueue(LocalStorage(CERTIFICATE_STORAGE_DIR, CERTIFICATE_BASE_URL))
@@ -0,0 +1,15 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+DIALECT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def conflict_insert(db: AsyncSession, model):
+    # insert() с поддержкой ON CONFLICT для диалекта текущей базы
+    return DIALECT_INSERTS[db.bind.dialect.name](model)
+
+
+def chunked(rows, size: int):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
@@ -1,6 +1,8 @@
 from course_app.db.database import Base
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Enum, DateTime, ForeignKey, Text, DECIMAL, Boolean
+from sqlalchemy import (Integer, String, Enum, DateTime, ForeignKey, Text, DECIMAL, Boolean, Computed, Index,
+                        UniqueConstraint, JSON)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from typing import Optional, List
 from enum import Enum as PyEnum
 from datetime import datetime
@@ -28,6 +30,7 @@ class UserProfile(Base):
     first_name: Mapped[str] = mapped_column(String(32))
     last_name: Mapped[str] = mapped_column(String(64))
     username: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    email: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     phone_number: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
     age: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -62,9 +65,11 @@ class RefreshToken(Base):
     __tablename__ = 'RefreshToken'
 
     id: Mapped[int] = mapped_column(autoincrement=True, primary_key=True)
-    token: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    jti: Mapped[str] = mapped_column(String(32), unique=True, nullable=False)
+    token_hash: Mapped[str] = mapped_column(String(64), nullable=False)
     created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
     user: Mapped[UserProfile] = relationship(UserProfile, back_populates='tokens')
 
 
@@ -87,21 +92,44 @@ class LevelChoices(str, PyEnum):
     advanced = 'advanced'
 
 
+COURSE_SEARCH_CONFIG = 'simple'
+
+
 class Course(Base):
     __tablename__ = 'course'
+    __table_args__ = (
+        Index('ix_course_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_course_course_name_trgm', 'course_name', postgresql_using='gin',
+              postgresql_ops={'course_name': 'gin_trgm_ops'}),
+        Index('ix_course_price_id', 'price', 'id'),
+        Index('ix_course_level_price_id', 'level', 'price', 'id'),
+        Index('ix_course_avg_rating_id', 'avg_rating', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     course_name: Mapped[str] = mapped_column(String(140))
     course_image: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     description: Mapped[str] = mapped_column(Text)
-    category_id: Mapped[int] = mapped_column(ForeignKey('category.id'))
+    category_id: Mapped[int] = mapped_column(ForeignKey('category.id'), index=True)
     category: Mapped[Category] = relationship(Category, back_populates='category_course')
     level: Mapped[LevelChoices] = mapped_column(Enum(LevelChoices), nullable=True, default=LevelChoices.beginner)
     price: Mapped[float] = mapped_column(DECIMAL(10, 2))
-    created_by_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    created_by_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
     created_by: Mapped[UserProfile] = relationship(UserProfile, back_populates='created_user')
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                 index=True)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    avg_rating: Mapped[float] = mapped_column(
+        DECIMAL(3, 2),
+        Computed('CASE WHEN rating_count > 0 THEN ROUND(CAST(rating_sum AS NUMERIC) / rating_count, 2) ELSE 0 END',
+                 persisted=True))
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{COURSE_SEARCH_CONFIG}', coalesce(course_name, '') || ' ' || coalesce(description, ''))",
+                 persisted=True),
+        deferred=True)
     course_lessons: Mapped[List['Lesson']] = relationship('Lesson', back_populates='course',
                                                     cascade='all, delete-orphan')
     course_assignments: Mapped[List['Assignment']] = relationship('Assignment', back_populates='course',
@@ -124,7 +152,7 @@ class Lesson(Base):
     title: Mapped[str] = mapped_column(String(140))
     video_url: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     content: Mapped[str] = mapped_column(Text)
-    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'))
+    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'), index=True)
     course: Mapped[Course] = relationship('Course', back_populates='course_lessons')
 
     def __str__(self):
@@ -138,7 +166,7 @@ class Assignment(Base):
     title: Mapped[str] = mapped_column(String(200))
     description: Mapped[str] = mapped_column(Text)
     due_date: Mapped[datetime] = mapped_column(DateTime)
-    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'))
+    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'), index=True)
     course: Mapped[Course] = relationship('Course', back_populates='course_assignments')
 
     def __str__(self):
@@ -150,10 +178,11 @@ class Exam(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(200))
-    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'))
+    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'), index=True)
     course: Mapped[Course] = relationship('Course', back_populates='course_exam')
     passing_score: Mapped[ValidatorChoices] = mapped_column(Enum(ValidatorChoices), nullable=True)
     duration: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default='1', nullable=False)
     exam_questions: Mapped[List['Question']] = relationship('Question', back_populates='exam',
                                                             cascade='all, delete-orphan')
 
@@ -174,7 +203,7 @@ class Question(Base):
     text: Mapped[str] = mapped_column(String(200))
     created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     difficulty_level: Mapped[DifficultyLevelChoices] = mapped_column(Enum(DifficultyLevelChoices), nullable=True)
-    exam_id: Mapped[int] = mapped_column(ForeignKey('exam.id'))
+    exam_id: Mapped[int] = mapped_column(ForeignKey('exam.id'), index=True)
     exam: Mapped[Exam] = relationship('Exam', back_populates='exam_questions')
     question_options: Mapped[List['Option']] = relationship('Option', back_populates='question',
                                                       cascade='all, delete-orphan')
@@ -187,7 +216,7 @@ class Option(Base):
     __tablename__ = 'options'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    question_id: Mapped[int] = mapped_column(ForeignKey('question.id'))
+    question_id: Mapped[int] = mapped_column(ForeignKey('question.id'), index=True)
     question: Mapped[Question] = relationship('Question', back_populates='question_options')
     is_correct: Mapped[bool] = mapped_column(Boolean)
 
@@ -195,16 +224,51 @@ class Option(Base):
         return f'{self.question_id}, {self.is_correct}'
 
 
+class ExamAttempt(Base):
+    __tablename__ = 'exam_attempt'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    exam_id: Mapped[int] = mapped_column(ForeignKey('exam.id', ondelete='CASCADE'), index=True)
+    student_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id', ondelete='CASCADE'), index=True)
+    answers: Mapped[dict] = mapped_column(JSON)
+    correct: Mapped[int] = mapped_column(Integer)
+    total: Mapped[int] = mapped_column(Integer)
+    score: Mapped[float] = mapped_column(DECIMAL(5, 2))
+    passed: Mapped[bool] = mapped_column(Boolean)
+    submitted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __str__(self):
+        return f'{self.exam_id}, {self.student_id}, {self.score}'
+
+
+class CertificateBatch(Base):
+    __tablename__ = 'certificate_batch'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    course_id: Mapped[int] = mapped_column(ForeignKey('course.id', ondelete='CASCADE'), index=True)
+    total: Mapped[int] = mapped_column(Integer)
+    done: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    failed: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __str__(self):
+        return f'{self.course_id}, {self.done}/{self.total}'
+
+
 class Certificate(Base):
     __tablename__ = 'certificate'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    student_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    student_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
     student: Mapped[UserProfile] = relationship('UserProfile', back_populates='students')
-    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'))
+    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'), index=True)
     course: Mapped[Course] = relationship('Course', back_populates='course_certificate')
     issued_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     certificate_url: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # пачка, в прогресс которой засчитается генерация; после неудачи обнуляется
+    batch_id: Mapped[Optional[int]] = mapped_column(ForeignKey('certificate_batch.id', ondelete='SET NULL'),
+                                                    nullable=True, index=True)
 
     def __str__(self):
         return f'{self.student_id}, {self.course_id}, {self.issued_at}'
@@ -214,12 +278,14 @@ class Review(Base):
     __tablename__ = 'review'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
     user: Mapped[UserProfile] = relationship('UserProfile', back_populates='student_review')
-    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'))
+    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'), index=True)
     course: Mapped[Course] = relationship('Course', back_populates='course_rating')
     rating: Mapped[ValidatorChoices] = mapped_column(Enum(ValidatorChoices), nullable=True)
     comment: Mapped[str] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                 index=True)
 
     def __str__(self):
         return f'{self.user_id}, {self.rating}, {self.course_id}'
@@ -237,11 +303,14 @@ class Cart(Base):
 
 class CartItem(Base):
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        UniqueConstraint('cart_id', 'course_id', name='uq_cart_items_cart_id_course_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     cart_id: Mapped[int] = mapped_column(ForeignKey('cart.id'))
     cart: Mapped['Cart'] = relationship('Cart', back_populates='items')
-    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'))
+    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'), index=True)
     course: Mapped[Course] = relationship('Course')
 
 
@@ -249,7 +318,7 @@ class Favorite(Base):
     __tablename__ = 'favorite'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
     user: Mapped[UserProfile] = relationship('UserProfile', back_populates='fav_user')
     fav_items: Mapped[List['FavoriteItem']] = relationship('FavoriteItem', back_populates='fav',
                                                            cascade='all, delete-orphan')
@@ -257,9 +326,12 @@ class Favorite(Base):
 
 class FavoriteItem(Base):
     __tablename__ = 'favorite_item'
+    __table_args__ = (
+        UniqueConstraint('fav_id', 'course_id', name='uq_favorite_item_fav_id_course_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     fav_id: Mapped[int] = mapped_column(ForeignKey('favorite.id'))
     fav: Mapped[Favorite] = relationship('Favorite', back_populates='fav_items')
-    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'))
+    course_id: Mapped[int] = mapped_column(ForeignKey('course.id'), index=True)
     course: Mapped[Course] = relationship('Course')
\ No newline at end of file
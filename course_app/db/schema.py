@@ -2,7 +2,7 @@ from pydantic import BaseModel
 from typing import Optional
 from course_app.db.models import RoleChoices, LevelChoices, ValidatorChoices, DifficultyLevelChoices, FavoriteItem
 from datetime import datetime
-from typing import List
+from typing import List, Dict
 
 
 class UserProfileSchema(BaseModel):
@@ -10,6 +10,7 @@ class UserProfileSchema(BaseModel):
     first_name: str
     last_name: str
     username: str
+    email: Optional[str] = None
     phone_number: Optional[str]
     password: str
     age: Optional[int]
@@ -21,6 +22,12 @@ class UserProfileSchema(BaseModel):
         from_attributes = True
 
 
+class CurrentUserSchema(BaseModel):
+    id: int
+    username: str
+    role: Optional[RoleChoices]
+
+
 class CategorySchema(BaseModel):
     id: int
     category_name: str
@@ -37,6 +44,13 @@ class CourseSchema(BaseModel):
     created_by_id: int
     created_at: datetime
     updated_at: datetime
+    rating_count: int = 0
+    avg_rating: float = 0
+
+
+class CourseCursorPageSchema(BaseModel):
+    items: List[CourseSchema]
+    next_cursor: Optional[str]
 
 
 class LessonSchema(BaseModel):
@@ -63,6 +77,20 @@ class ExamSchema(BaseModel):
     duration: Optional[int]
 
 
+class CourseRatingSchema(BaseModel):
+    avg_rating: float
+    rating_count: int
+    distribution: Dict[str, int]
+
+
+class CourseDetailSchema(CourseSchema):
+    category: Optional[CategorySchema] = None
+    lessons: Optional[List[LessonSchema]] = None
+    assignments: Optional[List[AssignmentSchema]] = None
+    exams: Optional[List[ExamSchema]] = None
+    rating: Optional[CourseRatingSchema] = None
+
+
 class QuestionSchema(BaseModel):
     id: int
     text: str
@@ -77,6 +105,50 @@ class OptionSchema(BaseModel):
     is_correct: bool
 
 
+class ExamOptionSchema(BaseModel):
+    id: int
+    is_correct: Optional[bool] = None
+
+
+class ExamQuestionSchema(QuestionSchema):
+    options: List[ExamOptionSchema]
+
+
+class ExamFullSchema(ExamSchema):
+    version: int
+    questions: List[ExamQuestionSchema]
+
+
+class ExamSubmitSchema(BaseModel):
+    answers: Dict[int, List[int]]
+
+
+class ExamAttemptSchema(BaseModel):
+    id: int
+    exam_id: int
+    student_id: int
+    correct: int
+    total: int
+    score: float
+    passed: bool
+    submitted_at: datetime
+
+
+class CertificateBulkSchema(BaseModel):
+    course_id: int
+    student_ids: Optional[List[int]] = None
+
+
+class CertificateBatchSchema(BaseModel):
+    id: int
+    course_id: int
+    total: int
+    done: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+
 class CertificateSchema(BaseModel):
     id:int
     student_id: int
@@ -98,10 +170,23 @@ class CartItemSchema(BaseModel):
     course_id: int
 
 
+class CourseSummarySchema(BaseModel):
+    id: int
+    course_name: str
+    course_image: Optional[str]
+    price: float
+
+
+class CartItemDetailSchema(BaseModel):
+    id: int
+    course_id: int
+    course: CourseSummarySchema
+
+
 class CartSchema(BaseModel):
     id: int
     users_id: int
-    items: List[CartItemSchema] = []
+    items: List[CartItemDetailSchema] = []
     total_price: float
 
 
@@ -109,6 +194,10 @@ class CartItemCreateSchema(BaseModel):
     course_id: int
 
 
+class CartItemBatchSchema(BaseModel):
+    course_ids: List[int]
+
+
 class FavoriteItemSchema(BaseModel):
     id: int
     course_id: int
@@ -121,4 +210,8 @@ class FavoriteSchema(BaseModel):
 
 
 class FavoriteItemCreateSchema(BaseModel):
-    course_id: int
\ No newline at end of file
+    course_id: int
+
+
+class FavoriteItemBatchSchema(BaseModel):
+    course_ids: List[int]
\ No newline at end of file
@@ -0,0 +1,27 @@
+import re
+from sqlalchemy import select, func, or_, desc
+from course_app.db.models import Course, COURSE_SEARCH_CONFIG
+
+
+def prefix_tsquery(term: str):
+    words = re.findall(r'\w+', term.lower())
+    if not words:
+        return None
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def course_search_query(term: str):
+    """Ranked course search: full-text prefix match over course_name and
+    description (GIN on search_vector), plus trigram word similarity on
+    course_name (GIN gin_trgm_ops) so misspelled names still match."""
+    tsquery_text = prefix_tsquery(term)
+    if tsquery_text is None:
+        return None
+
+    ts_query = func.to_tsquery(COURSE_SEARCH_CONFIG, tsquery_text)
+    rank = func.ts_rank_cd(Course.search_vector, ts_query) + func.word_similarity(term, Course.course_name)
+
+    return (select(Course)
+            .where(or_(Course.search_vector.op('@@')(ts_query),
+                       Course.course_name.op('%>')(term)))
+            .order_by(desc(rank), Course.id))
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+from types import NoneType
+from typing import get_args
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from course_app.config import IMPORT_BATCH_SIZE, IMPORT_MAX_ERRORS
+from course_app.db.bulk import conflict_insert
+from course_app.db.models import Course, Lesson, Assignment, Exam, Question, Option
+from course_app.db.schema import (CourseSchema, LessonSchema, AssignmentSchema, ExamSchema, QuestionSchema,
+                                  OptionSchema, CurrentUserSchema)
+from course_app.cache import invalidate_tags
+from course_app.api.endpoints.course import RATING_FIELDS, invalidate_course_includes
+from course_app.api.endpoints.exam import bump_exam_version, invalidate_exam
+from course_app.api.endpoints.option import bump_option_exams
+
+
+IMPORTS = {
+    'courses': (Course, CourseSchema),
+    'lessons': (Lesson, LessonSchema),
+    'assignments': (Assignment, AssignmentSchema),
+    'exams': (Exam, ExamSchema),
+    'questions': (Question, QuestionSchema),
+    'options': (Option, OptionSchema),
+}
+# столбец родителя в дочерней таблице и запрос (id родителя, автор курса) для проверки владельца
+PARENT_OWNERS = {
+    Lesson: (Lesson.course_id, select(Course.id, Course.created_by_id)),
+    Assignment: (Assignment.course_id, select(Course.id, Course.created_by_id)),
+    Exam: (Exam.course_id, select(Course.id, Course.created_by_id)),
+    Question: (Question.exam_id, select(Exam.id, Course.created_by_id).join(Course, Course.id == Exam.course_id)),
+    Option: (Option.question_id, select(Question.id, Course.created_by_id)
+             .join(Exam, Exam.id == Question.exam_id).join(Course, Course.id == Exam.course_id)),
+}
+# время создания и изменения не берется из файла при обновлении
+TIMESTAMP_FIELDS = {'created_at', 'updated_at'}
+IMPORT_FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'json'}
+
+
+def detect_format(filename: str):
+    for extension, file_format in IMPORT_FORMATS.items():
+        if filename and filename.lower().endswith(extension):
+            return file_format
+    return None
+
+
+def nullable_fields(schema):
+    return {name for name, field in schema.model_fields.items() if NoneType in get_args(field.annotation)}
+
+
+def iter_json_array(file, chunk_size: int = 65536):
+    # JSON-массив читается кусками, в памяти только текущий кусок
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        chunk = file.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or (started and buffer[position] == ',')):
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('JSON массив күтүлгөн')
+                started, position = True, position + 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise ValueError('JSON файл бузулган')
+                break
+            yield record
+        if not chunk:
+            raise ValueError('JSON массив жабылган эмес')
+
+
+def read_records(file, file_format: str, nullable=frozenset()):
+    # выдает (номер записи, запись или ошибка разбора)
+    if file_format == 'csv':
+        for number, record in enumerate(csv.DictReader(file), 1):
+            # в CSV нет null: пустая ячейка необязательного поля считается None
+            yield number, {key: None if value == '' and key in nullable else value for key, value in record.items()}
+    elif file_format == 'ndjson':
+        number = 0
+        for line in file:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, e
+    else:
+        yield from enumerate(iter_json_array(file), 1)
+
+
+async def read_in_threadpool(records, batch_size: int = IMPORT_BATCH_SIZE):
+    # разбор файла (декодирование, csv, json) идет в пуле потоков, а не в event loop
+    while True:
+        chunk = await run_in_threadpool(list, islice(records, batch_size))
+        if not chunk:
+            return
+        for record in chunk:
+            yield record
+
+
+class ImportReport:
+    def __init__(self, max_errors: int = IMPORT_MAX_ERRORS):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, row: int, messages):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row, 'errors': messages})
+
+    def as_dict(self):
+        return {'imported': self.imported, 'failed': self.failed,
+                'errors': sorted(self.errors, key=lambda error: error['row'])}
+
+
+def validation_messages(e: ValidationError):
+    return [f'{".".join(map(str, error["loc"])) or "row"}: {error["msg"]}' for error in e.errors()]
+
+
+async def owned_rows(db: AsyncSession, model, rows, report: ImportReport, owner_id: int):
+    # новая строка попадает только в курс текущего пользователя, остальные - ошибки по строкам
+    column, query = PARENT_OWNERS[model]
+    parent_ids = {row[column.key] for _, row in rows}
+    owners = dict((await db.execute(query.where(query.selected_columns[0].in_(parent_ids)))).all())
+    allowed = []
+    for number, row in rows:
+        if row[column.key] not in owners:
+            report.error(number, ['Мындай маалымат жок'])
+        elif owners[row[column.key]] != owner_id:
+            report.error(number, ['Бул маалыматты өзгөртүүгө укугуңуз жок'])
+        else:
+            allowed.append((number, row))
+    return allowed
+
+
+async def upsert_rows(db: AsyncSession, model, columns, rows, owner_id: int = None):
+    statement = conflict_insert(db, model).values(rows)
+    set_ = {column: statement.excluded[column] for column in columns - {'id'} - TIMESTAMP_FIELDS}
+    if 'updated_at' in model.__table__.columns:
+        set_['updated_at'] = datetime.utcnow()
+    where = None
+    if model is Course and owner_id is not None:
+        # автор курса не меняется, а чужие курсы импорт не трогает
+        set_.pop('created_by_id', None)
+        where = Course.created_by_id == owner_id
+    elif owner_id is not None:
+        # существующая строка обновляется, только если она уже лежит в курсе текущего пользователя
+        column, query = PARENT_OWNERS[model]
+        where = column.in_(query.with_only_columns(query.selected_columns[0])
+                           .where(Course.created_by_id == owner_id))
+    statement = statement.on_conflict_do_update(
+        index_elements=[model.id],
+        set_=set_,
+        where=where,
+    ).returning(model.id)
+    return set((await db.execute(statement)).scalars().all())
+
+
+async def import_batch(db: AsyncSession, model, columns, rows, report: ImportReport, owner_id: int = None):
+    # rows: [(номер строки, значения)], каждая пачка в своем SAVEPOINT
+    try:
+        async with db.begin_nested():
+            written = await upsert_rows(db, model, columns, [row for _, row in rows], owner_id)
+    except (IntegrityError, DataError) as e:
+        if len(rows) == 1:
+            report.error(rows[0][0], [str(e.orig).splitlines()[0]])
+            return []
+        # пачка упала (чаще всего внешний ключ) - делим пополам, пока не найдем плохие строки
+        middle = len(rows) // 2
+        return (await import_batch(db, model, columns, rows[:middle], report, owner_id)
+                + await import_batch(db, model, columns, rows[middle:], report, owner_id))
+    for number, row in rows:
+        if row['id'] not in written:
+            report.error(number, ['Бул маалыматты өзгөртүүгө укугуңуз жок'])
+    report.imported += len(written)
+    return [row for _, row in rows if row['id'] in written]
+
+
+async def bump_imported(db: AsyncSession, name: str, ids):
+    # версии экзаменов, чьи вопросы или варианты изменились
+    if name == 'exams' or name == 'questions':
+        return await bump_exam_version(db, Exam.id.in_(ids))
+    if name == 'options':
+        return await bump_option_exams(db, *ids)
+    return []
+
+
+async def import_records(db: AsyncSession, name: str, records, current_user: CurrentUserSchema = None,
+                         batch_size: int = IMPORT_BATCH_SIZE):
+    # current_user=None - импорт из командной строки, без проверки владельца
+    model, schema = IMPORTS[name]
+    owner_id = current_user.id if current_user is not None else None
+    columns = (set(schema.model_fields) & set(model.__table__.columns.keys())) - RATING_FIELDS
+    report = ImportReport()
+    # exam_id для вопросов, question_id для вариантов
+    parent = {'exams': 'id', 'questions': 'exam_id', 'options': 'question_id'}.get(name)
+    course_ids, parent_ids = set(), set()
+
+    async def flush(batch):
+        rows = list(batch.values())
+        if model is not Course and owner_id is not None:
+            rows = await owned_rows(db, model, rows, report, owner_id)
+        if not rows:
+            return
+        rows = await import_batch(db, model, columns, rows, report, owner_id)
+        course_ids.update(row['course_id'] for row in rows if 'course_id' in row)
+        if parent:
+            parent_ids.update(row[parent] for row in rows)
+
+    # повтор id внутри одной пачки ON CONFLICT не принимает, поэтому более поздняя строка вытесняет раннюю
+    batch = {}
+    async for number, record in read_in_threadpool(records, batch_size):
+        if isinstance(record, Exception):
+            report.error(number, [str(record)])
+            continue
+        try:
+            values = schema.model_validate(record).model_dump(include=columns)
+        except ValidationError as e:
+            report.error(number, validation_messages(e))
+            continue
+        if model is Course and owner_id is not None:
+            values['created_by_id'] = owner_id
+        if 'updated_at' in values:
+            values['updated_at'] = datetime.utcnow()
+        if values['id'] in batch:
+            report.imported += 1
+        batch[values['id']] = (number, values)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = {}
+    if batch:
+        await flush(batch)
+
+    exam_ids = await bump_imported(db, name, parent_ids) if parent_ids else []
+
+    # id пришли из файла, sequence надо догнать, иначе следующий INSERT без id упадет
+    if db.bind.dialect.name == 'postgresql' and report.imported:
+        await db.execute(select(func.setval(func.pg_get_serial_sequence(model.__tablename__, 'id'),
+                                            func.coalesce(func.max(model.id), 1))))
+    await db.commit()
+
+    if exam_ids:
+        await invalidate_exam(*exam_ids)
+    if name == 'courses':
+        await invalidate_tags('course_list', 'course_detail', 'carts')
+    elif course_ids:
+        await invalidate_course_includes(*course_ids)
+    return report.as_dict()
+
+
+async def import_file(name: str, path: str, file_format: str = None, batch_size: int = IMPORT_BATCH_SIZE):
+    from course_app.db.database import AsyncSessionLocal, async_engine
+
+    file_format = file_format or detect_format(path)
+    if file_format is None:
+        raise SystemExit(f'unknown file format: {path}')
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        records = read_records(file, file_format, nullable_fields(IMPORTS[name][1]))
+        async with AsyncSessionLocal() as db:
+            report = await import_records(db, name, records, batch_size=batch_size)
+    await async_engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import courses, lessons, exams or question banks from CSV/JSON')
+    parser.add_argument('name', choices=IMPORTS)
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=sorted(set(IMPORT_FORMATS.values())))
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    report = asyncio.run(import_file(args.name, args.path, args.format, args.batch_size))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
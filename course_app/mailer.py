@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import random
+import smtplib
+from collections import deque
+from dataclasses import dataclass
+from email.message import EmailMessage
+from course_app.config import (SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, EMAIL_FROM, EMAIL_TRANSPORT,
+                               EMAIL_WORKERS, EMAIL_BATCH_SIZE, EMAIL_MAX_RETRIES, EMAIL_RETRY_BASE_DELAY)
+
+
+logger = logging.getLogger(__name__)
+
+STUB_OUTBOX_SIZE = 100
+
+
+@dataclass
+class OutgoingEmail:
+    to: str
+    subject: str
+    body: str
+    attempts: int = 0
+
+    def to_message(self):
+        message = EmailMessage()
+        message['From'] = EMAIL_FROM
+        message['To'] = self.to
+        message['Subject'] = self.subject
+        message.set_content(self.body)
+        return message
+
+
+class SMTPTransport:
+    # одно SMTP-соединение на всю пачку писем
+    def _send_batch(self, emails):
+        failed = []
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as server:
+            server.starttls()
+            if SMTP_USER:
+                server.login(SMTP_USER, SMTP_PASSWORD)
+            for email in emails:
+                try:
+                    server.send_message(email.to_message())
+                except smtplib.SMTPException as e:
+                    logger.warning('email to %s failed: %s', email.to, e)
+                    failed.append(email)
+        return failed
+
+    async def send_batch(self, emails):
+        return await asyncio.to_thread(self._send_batch, emails)
+
+
+class StubTransport:
+    # без SMTP письма только логируются; в outbox остаются последние, старые вытесняются
+    def __init__(self, keep: int = STUB_OUTBOX_SIZE):
+        self.outbox = deque(maxlen=keep)
+
+    async def send_batch(self, emails):
+        for email in emails:
+            logger.info('SMTP is not configured, email to %s dropped: %s', email.to, email.subject)
+        self.outbox.extend(emails)
+        return []
+
+
+class EmailQueue:
+    def __init__(self, transport, workers: int = EMAIL_WORKERS, batch_size: int = EMAIL_BATCH_SIZE,
+                 max_retries: int = EMAIL_MAX_RETRIES, retry_base_delay: float = EMAIL_RETRY_BASE_DELAY):
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.queue = asyncio.Queue()
+        self.tasks = []
+
+    def send(self, to: str, subject: str, body: str):
+        self.queue.put_nowait(OutgoingEmail(to=to, subject=subject, body=body))
+
+    async def start(self):
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning('email queue stopped with %s unsent emails', self.queue.qsize())
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def _retry(self, email: OutgoingEmail):
+        email.attempts += 1
+        if email.attempts > self.max_retries:
+            logger.error('email to %s dropped after %s attempts', email.to, email.attempts)
+            return
+        delay = self.retry_base_delay * 2 ** (email.attempts - 1) * random.uniform(0.8, 1.2)
+        asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, email)
+
+    async def _worker(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                failed = await self.transport.send_batch(batch)
+            except Exception as e:
+                logger.warning('email batch of %s failed: %s', len(batch), e)
+                failed = batch
+            for email in failed:
+                self._retry(email)
+            for _ in batch:
+                self.queue.task_done()
+
+
+def create_transport():
+    if EMAIL_TRANSPORT == 'smtp':
+        return SMTPTransport()
+    return StubTransport()
+
+
+email_queue = EmailQueue(create_transport())
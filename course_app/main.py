@@ -1,12 +1,20 @@
 from fastapi import FastAPI
 from fastapi_limiter import FastAPILimiter
-from course_app.db.database import SessionLocal
-from course_app.api.endpoints import auth, assignment, category, certificate, course, exam, lesson, option, question, review, oauth, cart, favorite
+from course_app.api.endpoints import auth, assignment, category, certificate, course, exam, lesson, option, question, review, oauth, cart, favorite, monitoring, export, imports
 import redis.asyncio as aioredis
 from contextlib import asynccontextmanager
 from course_app.admin.setup import setup_admin
+from course_app.cache import init_cache, listen_invalidations
+from course_app.mailer import email_queue
+from course_app.metrics import MetricsMiddleware, instrument_engine, rate_limit_callback
+from course_app.db.database import async_engine
+from course_app import profiler
+from course_app.certificates import certificate_queue
+from course_app.config import CERTIFICATE_STORAGE_DIR, CERTIFICATE_BASE_URL, QUERY_PROFILER
+from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 import uvicorn
+import asyncio
 from fastapi_pagination import add_pagination
 
 
@@ -17,23 +25,33 @@ async def init_redis():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     redis_client = await init_redis()
-    await FastAPILimiter.init(redis_client)
+    await FastAPILimiter.init(redis_client, http_callback=rate_limit_callback)
+    init_cache(redis_client)
+    invalidation_listener = asyncio.create_task(listen_invalidations(redis_client))
+    await email_queue.start()
+    await certificate_queue.start()
+    token_sweeper = asyncio.create_task(auth.sweep_refresh_tokens())
     yield
+    token_sweeper.cancel()
+    await asyncio.gather(token_sweeper, return_exceptions=True)
+    await certificate_queue.stop()
+    await email_queue.stop()
+    invalidation_listener.cancel()
+    await asyncio.gather(invalidation_listener, return_exceptions=True)
     await redis_client.close()
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 course_app = FastAPI(title='course_site', lifespan=lifespan)
 course_app.add_middleware(SessionMiddleware, secret_key="SECRET_KEY")
+course_app.add_middleware(MetricsMiddleware)
+instrument_engine(async_engine.sync_engine)
+if QUERY_PROFILER:
+    course_app.add_middleware(profiler.QueryProfilerMiddleware)
+    profiler.instrument_engine(async_engine.sync_engine)
 setup_admin(course_app)
 add_pagination(course_app)
+course_app.mount(CERTIFICATE_BASE_URL, StaticFiles(directory=CERTIFICATE_STORAGE_DIR, check_dir=False),
+                 name='certificates')
 
 
 course_app.include_router(auth.auth_router)
@@ -49,6 +67,10 @@ course_app.include_router(lesson.lesson_router)
 course_app.include_router(question.question_router)
 course_app.include_router(option.option_router)
 course_app.include_router(review.review_router)
+course_app.include_router(monitoring.monitoring_router)
+course_app.include_router(monitoring.metrics_router)
+course_app.include_router(export.export_router)
+course_app.include_router(imports.import_router)
 
 
 
@@ -0,0 +1,232 @@
+import bisect
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from fastapi_limiter import http_default_callback
+from course_app.cache import cache_stats
+from course_app.certificates import certificate_queue
+from course_app.mailer import email_queue
+from course_app.db.database import async_engine, pool_stats, pool_status
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+UNMATCHED_ROUTE = '<unmatched>'
+BACKGROUND_ROUTE = '<background>'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values = defaultdict(float)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self):
+        return self.header() + [f'{self.name}{format_labels(labels)} {format_value(value)}'
+                                for labels, value in sorted(self.values.items())]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        self.values[tuple(sorted(labels.items()))] += amount
+
+    def set_total(self, value: float, **labels):
+        # для счетчиков, которые уже ведет другой модуль (cache_stats, pool_stats)
+        self.values[tuple(sorted(labels.items()))] = value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount: float = 1, **labels):
+        self.values[tuple(sorted(labels.items()))] += amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series['buckets'][index] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self):
+        lines = self.header()
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['buckets']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(labels + (("le", format_value(bound)),))} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels(labels + (("le", "+Inf"),))} {series["count"]}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(series["sum"])}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {series["count"]}')
+        return lines
+
+
+http_request_duration = Histogram('http_request_duration_seconds', 'HTTP request latency by route template')
+http_requests_in_progress = Gauge('http_requests_in_progress', 'HTTP requests being served')
+db_queries_per_request = Histogram('db_queries_per_request', 'SQL statements executed per HTTP request',
+                                   buckets=QUERY_COUNT_BUCKETS)
+db_query_duration_per_request = Histogram('db_query_duration_per_request_seconds',
+                                          'Time spent in SQL per HTTP request')
+db_queries = Counter('db_queries_total', 'SQL statements executed')
+db_query_seconds = Counter('db_query_seconds_total', 'Time spent in SQL')
+rate_limit_rejections = Counter('rate_limit_rejections_total', 'Requests rejected by the rate limiter')
+cache_requests = Counter('cache_requests_total', 'Cache lookups by namespace and result')
+cache_hit_ratio = Gauge('cache_hit_ratio', 'Share of cache lookups served without the loader')
+db_pool = Gauge('db_pool_connections', 'API connection pool state')
+db_pool_checkouts = Counter('db_pool_checkouts_total', 'Connections checked out of the API pool')
+db_pool_timeouts = Counter('db_pool_timeouts_total', 'Pool checkouts that timed out')
+db_pool_wait_max = Gauge('db_pool_wait_max_seconds', 'Longest wait for a pool connection')
+queue_size = Gauge('background_queue_size', 'Jobs waiting in in-process background queues')
+
+REGISTRY = [http_request_duration, http_requests_in_progress, db_queries_per_request, db_query_duration_per_request,
+            db_queries, db_query_seconds, rate_limit_rejections, cache_requests, cache_hit_ratio, db_pool,
+            db_pool_checkouts, db_pool_timeouts, db_pool_wait_max, queue_size]
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# счетчик запросов к базе текущего HTTP-запроса
+request_queries: ContextVar[Optional[QueryStats]] = ContextVar('request_queries', default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = request_queries.get()
+    if stats is None:
+        # фоновые задачи (очереди, sweeper) считаются отдельно от HTTP
+        db_queries.inc(route=BACKGROUND_ROUTE)
+        db_query_seconds.inc(elapsed, route=BACKGROUND_ROUTE)
+        return
+    stats.count += 1
+    stats.seconds += elapsed
+
+
+def handle_error(exception_context):
+    # после ошибки after_cursor_execute не вызывается, время начала надо снять
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine, 'handle_error', handle_error)
+
+
+def route_template(scope):
+    route = scope.get('route')
+    return route.path if route is not None else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = QueryStats()
+        token = request_queries.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        http_requests_in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_progress.inc(-1)
+            request_queries.reset(token)
+            # шаблон маршрута (/course/{course_id}/), а не сам путь - иначе метрик будет по одной на id
+            route = route_template(scope)
+            http_request_duration.observe(elapsed, method=scope['method'], route=route, status=status)
+            db_queries_per_request.observe(stats.count, route=route)
+            db_query_duration_per_request.observe(stats.seconds, route=route)
+            db_queries.inc(stats.count, route=route)
+            db_query_seconds.inc(stats.seconds, route=route)
+
+
+async def rate_limit_callback(request, response, pexpire: int):
+    rate_limit_rejections.inc(route=route_template(request.scope))
+    return await http_default_callback(request, response, pexpire)
+
+
+def collect_gauges():
+    # значения, которые уже считают другие модули, снимаются в момент опроса
+    for namespace, counter in cache_stats.as_dict().items():
+        for result in ('hits', 'local_hits', 'misses', 'coalesced'):
+            cache_requests.set_total(counter[result], namespace=namespace, result=result)
+        cache_hit_ratio.set(counter['hit_ratio'], namespace=namespace)
+
+    for name, value in pool_status(async_engine.sync_engine).items():
+        if name != 'pool':
+            db_pool.set(value, state=name)
+    db_pool_checkouts.set_total(pool_stats.checkouts)
+    db_pool_timeouts.set_total(pool_stats.timeouts)
+    db_pool_wait_max.set(pool_stats.wait_max)
+
+    queue_size.set(email_queue.queue.qsize(), queue='email')
+    queue_size.set(certificate_queue.queue.qsize(), queue='certificate')
+
+
+def render_metrics():
+    collect_gauges()
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
@@ -0,0 +1,138 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from course_app.config import QUERY_BUDGET_DEFAULT, QUERY_BUDGET_STRICT, QUERY_DUPLICATE_THRESHOLD
+from course_app.metrics import route_template
+
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = re.compile(r'\$\d+|\?|%\(\w+\)s')
+PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def statement_pattern(statement: str):
+    # IN (?, ?, ?) с разным числом параметров - один и тот же шаблон
+    pattern = PLACEHOLDER.sub('?', WHITESPACE.sub(' ', statement).strip())
+    return PLACEHOLDER_LIST.sub('?, ...', pattern)
+
+
+class RequestProfile:
+    def __init__(self, budget: int = QUERY_BUDGET_DEFAULT):
+        self.budget = budget
+        self.count = 0
+        self.seconds = 0.0
+        self.patterns = Counter()
+
+    def duplicates(self, threshold: int = QUERY_DUPLICATE_THRESHOLD):
+        return {pattern: count for pattern, count in self.patterns.items() if count >= threshold}
+
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def server_timing(self, total_seconds: float):
+        return (f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries", '
+                f'app;dur={total_seconds * 1000:.1f}')
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar('current_profile', default=None)
+
+
+class QueryBudget:
+    # бюджет маршрута: dependencies=[Depends(QueryBudget(3))]
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+
+    async def __call__(self):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.budget = self.max_queries
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is None:
+        return
+    profile.count += 1
+    profile.seconds += time.perf_counter() - conn.info['profile_started'].pop()
+    profile.patterns[statement_pattern(statement)] += 1
+
+
+def handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('profile_started'):
+        connection.info['profile_started'].pop()
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine, 'handle_error', handle_error)
+
+
+class QueryProfilerMiddleware:
+    def __init__(self, app, strict: bool = QUERY_BUDGET_STRICT):
+        self.app = app
+        self.strict = strict
+
+    def report(self, scope, profile: RequestProfile):
+        route = route_template(scope)
+        for pattern, count in profile.duplicates().items():
+            logger.warning('%s %s: statement executed %s times (possible N+1): %s',
+                           scope['method'], route, count, pattern)
+        if profile.over_budget():
+            logger.warning('%s %s: %s queries, budget %s', scope['method'], route, profile.count, profile.budget)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        rejected = False
+
+        async def send_wrapper(message):
+            nonlocal rejected
+            if rejected:
+                return
+            if message['type'] == 'http.response.start':
+                self.report(scope, profile)
+                headers = [*message.get('headers', []),
+                           (b'server-timing', profile.server_timing(time.perf_counter() - started).encode()),
+                           (b'x-query-count', str(profile.count).encode())]
+                duplicates = profile.duplicates()
+                if duplicates:
+                    headers.append((b'x-query-duplicates', str(sum(duplicates.values())).encode()))
+
+                # строгий режим для тестов: превышение бюджета превращает ответ в 500
+                if self.strict and profile.over_budget():
+                    rejected = True
+                    body = json.dumps({'detail': f'Query budget exceeded: {profile.count} > {profile.budget}',
+                                       'duplicates': duplicates}, ensure_ascii=False).encode()
+                    headers = [header for header in headers if header[0].lower() not in (b'content-length',
+                                                                                          b'content-type')]
+                    await send({'type': 'http.response.start', 'status': 500,
+                                'headers': [*headers, (b'content-type', b'application/json'),
+                                            (b'content-length', str(len(body)).encode())]})
+                    await send({'type': 'http.response.body', 'body': body})
+                    return
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
@@ -0,0 +1,56 @@
+"""Denormalized course rating aggregates.
+
+Course.rating_count / rating_sum are changed in the same transaction as the
+review, avg_rating is a generated column on top of them. To rebuild the
+aggregates from the review table (after a manual data fix, for example) run:
+
+    python -m course_app.ratings
+"""
+import asyncio
+from sqlalchemy import select, update, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from course_app.db.models import Course, Review, ValidatorChoices
+
+
+RATING_VALUES = {choice: int(choice.value) for choice in ValidatorChoices}
+
+
+async def apply_rating(db: AsyncSession, course_id: int, rating: ValidatorChoices, sign: int):
+    if rating is None:
+        return
+    await db.execute(
+        update(Course)
+        .where(Course.id == course_id)
+        .values(rating_count=Course.rating_count + sign,
+                rating_sum=Course.rating_sum + sign * RATING_VALUES[ValidatorChoices(rating)])
+    )
+
+
+async def backfill_course_ratings(db: AsyncSession, batch_size: int = 1000):
+    rated = (Review.course_id == Course.id) & Review.rating.is_not(None)
+    rating_count = select(func.count(Review.id)).where(rated).scalar_subquery()
+    rating_value = case(*((Review.rating == choice, value) for choice, value in RATING_VALUES.items()))
+    rating_sum = select(func.coalesce(func.sum(rating_value), 0)).where(rated).scalar_subquery()
+
+    last_id, updated = 0, 0
+    while True:
+        ids = (await db.scalars(select(Course.id).where(Course.id > last_id)
+                                .order_by(Course.id).limit(batch_size))).all()
+        if not ids:
+            return updated
+        await db.execute(update(Course).where(Course.id.in_(ids))
+                         .values(rating_count=rating_count, rating_sum=rating_sum))
+        await db.commit()
+        last_id, updated = ids[-1], updated + len(ids)
+
+
+async def main():
+    from course_app.db.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        updated = await backfill_course_ratings(db)
+    print(f'rating aggregates rebuilt for {updated} courses')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""exam attempt
+
+Revision ID: 3f8b2c6e0a19
+Revises: e4a90c6d1f57
+Create Date: 2026-10-18 14:52:30.218847
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8b2c6e0a19'
+down_revision: Union[str, None] = 'e4a90c6d1f57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('exam_attempt',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('exam_id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('answers', sa.JSON(), nullable=False),
+    sa.Column('correct', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('score', sa.DECIMAL(precision=5, scale=2), nullable=False),
+    sa.Column('passed', sa.Boolean(), nullable=False),
+    sa.Column('submitted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['exam_id'], ['exam.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['student_id'], ['user_profile.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_exam_attempt_exam_id'), 'exam_attempt', ['exam_id'], unique=False)
+    op.create_index(op.f('ix_exam_attempt_student_id'), 'exam_attempt', ['student_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_exam_attempt_student_id'), table_name='exam_attempt')
+    op.drop_index(op.f('ix_exam_attempt_exam_id'), table_name='exam_attempt')
+    op.drop_table('exam_attempt')
@@ -0,0 +1,28 @@
+"""user email
+
+Revision ID: 5c1d7e9a2b40
+Revises: 835e264a782f
+Create Date: 2026-10-18 12:40:05.113902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d7e9a2b40'
+down_revision: Union[str, None] = '835e264a782f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('user_profile', sa.Column('email', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user_profile', 'email')
@@ -0,0 +1,70 @@
+"""foreign key indexes
+
+Revision ID: 835e264a782f
+Revises: a3b29096a333
+Create Date: 2026-10-18 11:02:17.846210
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '835e264a782f'
+down_revision: Union[str, None] = 'a3b29096a333'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # оставляем только первую запись для каждой пары, иначе unique constraint не создать
+    op.execute('DELETE FROM cart_items a USING cart_items b '
+               'WHERE a.cart_id = b.cart_id AND a.course_id = b.course_id AND a.id > b.id')
+    op.execute('DELETE FROM favorite_item a USING favorite_item b '
+               'WHERE a.fav_id = b.fav_id AND a.course_id = b.course_id AND a.id > b.id')
+
+    op.create_index(op.f('ix_RefreshToken_user_id'), 'RefreshToken', ['user_id'], unique=False)
+    op.create_index(op.f('ix_course_category_id'), 'course', ['category_id'], unique=False)
+    op.create_index(op.f('ix_course_created_by_id'), 'course', ['created_by_id'], unique=False)
+    op.create_index('ix_course_price_id', 'course', ['price', 'id'], unique=False)
+    op.create_index('ix_course_level_price_id', 'course', ['level', 'price', 'id'], unique=False)
+    op.create_index(op.f('ix_lesson_course_id'), 'lesson', ['course_id'], unique=False)
+    op.create_index(op.f('ix_assignment_course_id'), 'assignment', ['course_id'], unique=False)
+    op.create_index(op.f('ix_exam_course_id'), 'exam', ['course_id'], unique=False)
+    op.create_index(op.f('ix_question_exam_id'), 'question', ['exam_id'], unique=False)
+    op.create_index(op.f('ix_options_question_id'), 'options', ['question_id'], unique=False)
+    op.create_index(op.f('ix_certificate_course_id'), 'certificate', ['course_id'], unique=False)
+    op.create_index(op.f('ix_certificate_student_id'), 'certificate', ['student_id'], unique=False)
+    op.create_index(op.f('ix_review_course_id'), 'review', ['course_id'], unique=False)
+    op.create_index(op.f('ix_review_user_id'), 'review', ['user_id'], unique=False)
+    op.create_index(op.f('ix_cart_items_course_id'), 'cart_items', ['course_id'], unique=False)
+    op.create_unique_constraint('uq_cart_items_cart_id_course_id', 'cart_items', ['cart_id', 'course_id'])
+    op.create_index(op.f('ix_favorite_user_id'), 'favorite', ['user_id'], unique=False)
+    op.create_index(op.f('ix_favorite_item_course_id'), 'favorite_item', ['course_id'], unique=False)
+    op.create_unique_constraint('uq_favorite_item_fav_id_course_id', 'favorite_item', ['fav_id', 'course_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_favorite_item_fav_id_course_id', 'favorite_item', type_='unique')
+    op.drop_index(op.f('ix_favorite_item_course_id'), table_name='favorite_item')
+    op.drop_index(op.f('ix_favorite_user_id'), table_name='favorite')
+    op.drop_constraint('uq_cart_items_cart_id_course_id', 'cart_items', type_='unique')
+    op.drop_index(op.f('ix_cart_items_course_id'), table_name='cart_items')
+    op.drop_index(op.f('ix_review_user_id'), table_name='review')
+    op.drop_index(op.f('ix_review_course_id'), table_name='review')
+    op.drop_index(op.f('ix_certificate_student_id'), table_name='certificate')
+    op.drop_index(op.f('ix_certificate_course_id'), table_name='certificate')
+    op.drop_index(op.f('ix_options_question_id'), table_name='options')
+    op.drop_index(op.f('ix_question_exam_id'), table_name='question')
+    op.drop_index(op.f('ix_exam_course_id'), table_name='exam')
+    op.drop_index(op.f('ix_assignment_course_id'), table_name='assignment')
+    op.drop_index(op.f('ix_lesson_course_id'), table_name='lesson')
+    op.drop_index('ix_course_level_price_id', table_name='course')
+    op.drop_index('ix_course_price_id', table_name='course')
+    op.drop_index(op.f('ix_course_created_by_id'), table_name='course')
+    op.drop_index(op.f('ix_course_category_id'), table_name='course')
+    op.drop_index(op.f('ix_RefreshToken_user_id'), table_name='RefreshToken')
@@ -0,0 +1,28 @@
+"""exam version
+
+Revision ID: 9a6d4b1e7c33
+Revises: 3f8b2c6e0a19
+Create Date: 2026-10-18 15:31:07.441920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a6d4b1e7c33'
+down_revision: Union[str, None] = '3f8b2c6e0a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('exam', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('exam', 'version')
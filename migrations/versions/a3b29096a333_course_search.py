@@ -0,0 +1,39 @@
+"""course search
+
+Revision ID: a3b29096a333
+Revises: 14941fa4c6b4
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3b29096a333'
+down_revision: Union[str, None] = '14941fa4c6b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('course', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                      sa.Computed("to_tsvector('simple', coalesce(course_name, '') || ' ' || "
+                                                  "coalesce(description, ''))", persisted=True),
+                                      nullable=True))
+    op.create_index('ix_course_search_vector', 'course', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+    op.create_index('ix_course_course_name_trgm', 'course', ['course_name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'course_name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_course_course_name_trgm', table_name='course', postgresql_using='gin',
+                  postgresql_ops={'course_name': 'gin_trgm_ops'})
+    op.drop_index('ix_course_search_vector', table_name='course', postgresql_using='gin')
+    op.drop_column('course', 'search_vector')
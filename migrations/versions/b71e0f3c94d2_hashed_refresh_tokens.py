@@ -0,0 +1,43 @@
+"""hashed refresh tokens
+
+Revision ID: b71e0f3c94d2
+Revises: 5c1d7e9a2b40
+Create Date: 2026-10-18 13:25:41.370528
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e0f3c94d2'
+down_revision: Union[str, None] = '5c1d7e9a2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # старые токены без jti проверить нельзя, пользователи войдут заново
+    op.execute('DELETE FROM "RefreshToken"')
+    op.drop_constraint('RefreshToken_token_key', 'RefreshToken', type_='unique')
+    op.drop_column('RefreshToken', 'token')
+    op.add_column('RefreshToken', sa.Column('jti', sa.String(length=32), nullable=False))
+    op.add_column('RefreshToken', sa.Column('token_hash', sa.String(length=64), nullable=False))
+    op.add_column('RefreshToken', sa.Column('expires_at', sa.DateTime(), nullable=False))
+    op.create_unique_constraint('RefreshToken_jti_key', 'RefreshToken', ['jti'])
+    op.create_index(op.f('ix_RefreshToken_expires_at'), 'RefreshToken', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DELETE FROM "RefreshToken"')
+    op.drop_index(op.f('ix_RefreshToken_expires_at'), table_name='RefreshToken')
+    op.drop_constraint('RefreshToken_jti_key', 'RefreshToken', type_='unique')
+    op.drop_column('RefreshToken', 'expires_at')
+    op.drop_column('RefreshToken', 'token_hash')
+    op.drop_column('RefreshToken', 'jti')
+    op.add_column('RefreshToken', sa.Column('token', sa.String(), nullable=False))
+    op.create_unique_constraint('RefreshToken_token_key', 'RefreshToken', ['token'])
@@ -0,0 +1,33 @@
+"""certificate batch id
+
+Revision ID: b8e1c4d7f210
+Revises: c5f19d3a7e02
+Create Date: 2026-10-18 21:14:03.527190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e1c4d7f210'
+down_revision: Union[str, None] = 'c5f19d3a7e02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('certificate', sa.Column('batch_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_certificate_batch_id'), 'certificate', ['batch_id'], unique=False)
+    op.create_foreign_key('certificate_batch_id_fkey', 'certificate', 'certificate_batch', ['batch_id'], ['id'],
+                          ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('certificate_batch_id_fkey', 'certificate', type_='foreignkey')
+    op.drop_index(op.f('ix_certificate_batch_id'), table_name='certificate')
+    op.drop_column('certificate', 'batch_id')
@@ -0,0 +1,34 @@
+"""export updated_at
+
+Revision ID: c5f19d3a7e02
+Revises: 6d2e8f4a1b95
+Create Date: 2026-10-18 18:20:13.905512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f19d3a7e02'
+down_revision: Union[str, None] = '6d2e8f4a1b95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # существующие отзывы получают время миграции, дальше значение ставит приложение
+    op.add_column('review', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+    op.alter_column('review', 'updated_at', server_default=None)
+    op.create_index(op.f('ix_review_updated_at'), 'review', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_course_updated_at'), 'course', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_course_updated_at'), table_name='course')
+    op.drop_index(op.f('ix_review_updated_at'), table_name='review')
+    op.drop_column('review', 'updated_at')
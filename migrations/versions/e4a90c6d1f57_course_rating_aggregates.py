@@ -0,0 +1,49 @@
+"""course rating aggregates
+
+Revision ID: e4a90c6d1f57
+Revises: b71e0f3c94d2
+Create Date: 2026-10-18 14:08:52.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a90c6d1f57'
+down_revision: Union[str, None] = 'b71e0f3c94d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('course', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('course', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('course', sa.Column(
+        'avg_rating', sa.DECIMAL(precision=3, scale=2),
+        sa.Computed('CASE WHEN rating_count > 0 THEN ROUND(CAST(rating_sum AS NUMERIC) / rating_count, 2) ELSE 0 END',
+                    persisted=True)))
+
+    op.execute("""
+        UPDATE course SET rating_count = r.rating_count, rating_sum = r.rating_sum
+        FROM (
+            SELECT course_id, count(*) AS rating_count,
+                   sum(CASE rating WHEN 'one' THEN 1 WHEN 'two' THEN 2 WHEN 'three' THEN 3
+                                   WHEN 'four' THEN 4 WHEN 'five' THEN 5 END) AS rating_sum
+            FROM review WHERE rating IS NOT NULL GROUP BY course_id
+        ) AS r
+        WHERE r.course_id = course.id
+    """)
+
+    op.create_index('ix_course_avg_rating_id', 'course', ['avg_rating', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_course_avg_rating_id', table_name='course')
+    op.drop_column('course', 'avg_rating')
+    op.drop_column('course', 'rating_sum')
+    op.drop_column('course', 'rating_count')
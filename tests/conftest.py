@@ -0,0 +1,119 @@
+import itertools
+import os
+import tempfile
+from datetime import datetime
+
+# настройки читаются при импорте course_app.config, поэтому задаются до него.
+# DB_URL всегда переопределяется: тесты пересоздают схему и не должны попасть в рабочую базу
+os.environ['DB_URL'] = os.getenv('TEST_DB_URL', f'sqlite:///{tempfile.gettempdir()}/course_app_test.db')
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ['QUERY_PROFILER'] = 'true'
+os.environ['QUERY_BUDGET_STRICT'] = 'true'
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.dialects.postgresql import TSVECTOR  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+
+from course_app import cache  # noqa: E402
+from course_app.db.database import AsyncSessionLocal, Base, async_engine  # noqa: E402
+from course_app.db.models import (Assignment, Cart, Category, Course, Exam, Favorite, Lesson, Review,  # noqa: E402
+                                  UserProfile, LevelChoices, RoleChoices, ValidatorChoices)
+from course_app.api.endpoints.auth import create_access_token  # noqa: E402
+from course_app.main import course_app  # noqa: E402
+
+
+# в SQLite нет tsvector: колонка search_vector хранится как текст
+@compiles(TSVECTOR, 'sqlite')
+def compile_tsvector_sqlite(type_, compiler, **kw):
+    return 'TEXT'
+
+
+if async_engine.dialect.name == 'sqlite':
+    @event.listens_for(async_engine.sync_engine, 'connect')
+    def register_sqlite_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function('to_tsvector', 2, lambda config, value: value, deterministic=True)
+
+
+# схема общая на всю сессию, поэтому имена в фикстурах уникальные
+unique = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture(scope='session')
+async def database():
+    async with async_engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            await conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    await async_engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    # без Redis кэш живет только в памяти процесса, тесты не должны видеть чужие записи
+    for local in cache.LOCAL_CACHES:
+        local.entries.clear()
+    yield
+    for local in cache.LOCAL_CACHES:
+        local.entries.clear()
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=course_app), base_url='http://test') as client:
+        yield client
+
+
+async def create_user(username: str, role=RoleChoices.student):
+    async with AsyncSessionLocal() as db:
+        user = UserProfile(first_name=username, last_name='Test', username=username, hashed_password='-',
+                           age=20, bio='', role=role)
+        db.add(user)
+        await db.flush()
+        db.add_all([Cart(users_id=user.id), Favorite(user_id=user.id)])
+        await db.commit()
+        return user.id, {'Authorization': f'Bearer {create_access_token({"sub": username})}'}
+
+
+@pytest.fixture
+async def teacher(database):
+    return await create_user(f'teacher_{next(unique)}', RoleChoices.teacher)
+
+
+@pytest.fixture
+async def other_teacher(database):
+    return await create_user(f'teacher_{next(unique)}', RoleChoices.teacher)
+
+
+@pytest.fixture
+async def student(database):
+    return await create_user(f'student_{next(unique)}')
+
+
+@pytest.fixture
+async def course_id(teacher):
+    teacher_id, _ = teacher
+    async with AsyncSessionLocal() as db:
+        category = Category(category_name=f'category_{next(unique)}')
+        db.add(category)
+        await db.flush()
+        course = Course(course_name='FastAPI', description='Async APIs', category_id=category.id,
+                        level=LevelChoices.beginner, price=100, created_by_id=teacher_id)
+        db.add(course)
+        await db.flush()
+        db.add_all([Lesson(title=f'Lesson {i}', content='...', course_id=course.id) for i in range(3)]
+                   + [Assignment(title='Homework', description='...', due_date=datetime(2030, 1, 1),
+                                 course_id=course.id)]
+                   + [Exam(title='Final', course_id=course.id, passing_score=ValidatorChoices.three, duration=60)]
+                   + [Review(user_id=teacher_id, course_id=course.id, rating=ValidatorChoices.five, comment='ok')])
+        await db.commit()
+        return course.id
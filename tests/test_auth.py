@@ -0,0 +1,30 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from course_app.api.endpoints import auth
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_password_hashing_runs_off_the_event_loop():
+    threads = []
+
+    def hash_password(password):
+        threads.append(threading.current_thread().name)
+        return password[::-1]
+
+    assert await auth.run_password_job(hash_password, 'secret') == 'terces'
+    assert threads[0].startswith('password-hash')
+
+
+async def test_password_queue_rejects_when_full(monkeypatch):
+    monkeypatch.setattr(auth, 'password_slots', asyncio.Semaphore(0))
+    monkeypatch.setattr(auth, 'PASSWORD_HASH_QUEUE_TIMEOUT', 0.01)
+
+    with pytest.raises(HTTPException) as error:
+        await auth.get_password_hash('secret')
+    assert error.value.status_code == 503
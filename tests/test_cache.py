@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from course_app import cache
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_read_through_coalesces_concurrent_misses():
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {'id': 1}
+
+    results = await asyncio.gather(*(cache.read_through('test', 'test:coalesce', 60, loader) for _ in range(50)))
+
+    assert calls == 1
+    assert results == [{'id': 1}] * 50
+    assert 'test:coalesce' not in cache.inflight
+
+
+async def test_read_through_error_reaches_every_waiter():
+    async def loader():
+        await asyncio.sleep(0.05)
+        raise ValueError('boom')
+
+    results = await asyncio.gather(*(cache.read_through('test', 'test:error', 60, loader) for _ in range(10)),
+                                   return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    # после ошибки ключ не залипает: следующий запрос снова вызывает loader
+    assert 'test:error' not in cache.inflight
+
+    async def retry():
+        return 'ok'
+
+    assert await cache.read_through('test', 'test:error', 60, retry) == 'ok'
+
+
+async def test_read_through_leader_cancellation_does_not_cancel_waiters():
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    leader = asyncio.create_task(cache.read_through('test', 'test:cancel', 60, loader))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(cache.read_through('test', 'test:cancel', 60, loader)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    # один из ожидающих становится новым лидером, остальные ждут уже его
+    assert await asyncio.gather(*waiters) == [2, 2, 2]
+    assert leader.cancelled()
+    assert calls == 2
+    assert 'test:cancel' not in cache.inflight
+
+
+@pytest.mark.parametrize('invalidate', [lambda: cache.cache_delete('test:stale'),
+                                        lambda: cache.invalidate_tags('test_tag')], ids=['key', 'tag'])
+async def test_read_through_skips_caching_value_invalidated_while_loading(invalidate):
+    async def loader():
+        await asyncio.sleep(0.05)
+        return 'old'
+
+    load = asyncio.create_task(cache.read_through('test', 'test:stale', 60, loader, tags=('test_tag',),
+                                                  local_ttl=60))
+    await asyncio.sleep(0.01)
+    await invalidate()
+
+    assert await load == 'old'
+    assert cache.local_cache.get('test:stale') is None
+
+
+async def test_course_detail_stampede_loads_once(client, course_id):
+    responses = await asyncio.gather(*(client.get(f'/course/{course_id}/') for _ in range(50)))
+
+    assert {response.status_code for response in responses} == {200}
+    assert sum(int(response.headers['x-query-count']) for response in responses) == 1
@@ -0,0 +1,17 @@
+import asyncio
+
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_cart_batches_do_not_duplicate_items(client, student, course_id):
+    _, headers = student
+
+    responses = await asyncio.gather(*(client.post('/cart/items:batch', json={'course_ids': [course_id]},
+                                                   headers=headers) for _ in range(5)))
+
+    assert {response.status_code for response in responses} == {200}
+    response = await client.get('/cart/', headers=headers)
+    assert [item['course_id'] for item in response.json()['items']] == [course_id]
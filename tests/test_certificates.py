@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import select
+
+from course_app.certificates import CertificateQueue, LocalStorage
+from course_app.db.database import AsyncSessionLocal
+from course_app.db.models import Certificate, CertificateBatch
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_start_requeues_certificates_left_without_document(student, course_id, tmp_path):
+    student_id, _ = student
+    async with AsyncSessionLocal() as db:
+        batch = CertificateBatch(course_id=course_id, total=1)
+        db.add(batch)
+        await db.flush()
+        # задание было поставлено в очередь прошлого процесса и потерялось при остановке
+        certificate = Certificate(student_id=student_id, course_id=course_id, batch_id=batch.id)
+        db.add(certificate)
+        await db.commit()
+        certificate_id, batch_id = certificate.id, batch.id
+
+    queue = CertificateQueue(LocalStorage(str(tmp_path), 'http://test/certificates'), workers=1)
+    await queue.start()
+    await queue.stop(timeout=60)
+
+    async with AsyncSessionLocal() as db:
+        certificate = await db.get(Certificate, certificate_id)
+        batch = await db.get(CertificateBatch, batch_id)
+        assert certificate.certificate_url.startswith('http://test/certificates/')
+        assert (batch.done, batch.failed) == (1, 0)
+        assert batch.finished_at is not None
+        assert not (await db.scalars(select(Certificate.id).where(Certificate.certificate_url.is_(None)))).all()
@@ -0,0 +1,27 @@
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+def course_body(course_id, **changes):
+    return {'id': course_id, 'course_name': 'Renamed', 'description': 'd', 'category_id': 1, 'level': 'beginner',
+            'price': 10, 'created_by_id': 999, 'course_image': None, 'created_at': '2024-01-01T00:00:00',
+            'updated_at': '2024-01-01T00:00:00', **changes}
+
+
+async def test_course_update_and_delete_require_owner(client, teacher, student, course_id):
+    teacher_id, teacher_headers = teacher
+    _, student_headers = student
+    detail = (await client.get(f'/course/{course_id}/')).json()
+    body = course_body(course_id, category_id=detail['category_id'])
+
+    assert (await client.put(f'/course/{course_id}/', json=body)).status_code == 401
+    assert (await client.put(f'/course/{course_id}/', json=body, headers=student_headers)).status_code == 403
+    assert (await client.delete(f'/course/{course_id}/', headers=student_headers)).status_code == 403
+
+    response = await client.put(f'/course/{course_id}/', json=body, headers=teacher_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()['course_name'] == 'Renamed'
+    # автор из тела запроса не берется
+    assert response.json()['created_by_id'] == teacher_id
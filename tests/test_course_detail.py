@@ -0,0 +1,25 @@
+import itertools
+
+import pytest
+
+from course_app.api.endpoints.course import COURSE_INCLUDES
+
+
+pytestmark = pytest.mark.anyio
+
+INCLUDES = sorted([*COURSE_INCLUDES, 'category', 'rating'])
+
+
+@pytest.mark.parametrize('includes', [frozenset(combination) for size in range(len(INCLUDES) + 1)
+                                      for combination in itertools.combinations(INCLUDES, size)],
+                         ids=lambda includes: ','.join(sorted(includes)) or 'none')
+async def test_course_detail_query_count(client, course_id, includes):
+    response = await client.get(f'/course/{course_id}/', params={'include': ','.join(sorted(includes))})
+
+    assert response.status_code == 200, response.text
+    # курс с категорией одним запросом, по одному selectin на коллекцию и один на распределение оценок
+    assert int(response.headers['x-query-count']) == (1 + len(includes & COURSE_INCLUDES.keys())
+                                                      + ('rating' in includes))
+    body = response.json()
+    for include in includes & COURSE_INCLUDES.keys():
+        assert body[include], include
@@ -0,0 +1,103 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from course_app.db.database import AsyncSessionLocal
+from course_app.db.models import Course, Exam, Lesson, Question
+
+
+pytestmark = pytest.mark.anyio
+
+
+def ndjson(*records):
+    return {'file': ('data.ndjson', '\n'.join(json.dumps(record) for record in records).encode())}
+
+
+async def next_id(model):
+    async with AsyncSessionLocal() as db:
+        return (await db.scalar(select(func.max(model.id))) or 0) + 1000
+
+
+async def test_lesson_import_is_limited_to_own_courses(client, teacher, other_teacher, course_id):
+    _, owner_headers = teacher
+    _, headers = other_teacher
+    async with AsyncSessionLocal() as db:
+        lesson = await db.scalar(select(Lesson).where(Lesson.course_id == course_id).limit(1))
+    new_id = await next_id(Lesson)
+    records = ndjson(
+        {'id': lesson.id, 'title': 'Hijacked', 'video_url': None, 'content': '-', 'course_id': course_id},
+        {'id': new_id, 'title': 'Injected', 'video_url': None, 'content': '-', 'course_id': course_id},
+    )
+
+    response = await client.post('/import/lessons', files=records, headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert response.json()['imported'] == 0
+    assert [error['row'] for error in response.json()['errors']] == [1, 2]
+    async with AsyncSessionLocal() as db:
+        assert (await db.get(Lesson, lesson.id)).title == lesson.title
+        assert await db.get(Lesson, new_id) is None
+
+    response = await client.post('/import/lessons', files=records, headers=owner_headers)
+
+    assert response.json() == {'imported': 2, 'failed': 0, 'errors': []}
+
+
+async def test_lesson_import_does_not_move_a_foreign_lesson_into_own_course(client, other_teacher, course_id):
+    other_id, headers = other_teacher
+    async with AsyncSessionLocal() as db:
+        source = await db.get(Course, course_id)
+        own_course = Course(course_name='Own', description='-', category_id=source.category_id, level=source.level,
+                            price=0, created_by_id=other_id)
+        db.add(own_course)
+        await db.flush()
+        lesson = await db.scalar(select(Lesson).where(Lesson.course_id == course_id).limit(1))
+        own_course_id = own_course.id
+        await db.commit()
+
+    response = await client.post('/import/lessons', files=ndjson(
+        {'id': lesson.id, 'title': 'Moved', 'video_url': None, 'content': '-', 'course_id': own_course_id},
+    ), headers=headers)
+
+    assert response.json()['errors'] == [{'row': 1, 'errors': ['Бул маалыматты өзгөртүүгө укугуңуз жок']}]
+    async with AsyncSessionLocal() as db:
+        assert (await db.get(Lesson, lesson.id)).course_id == course_id
+
+
+async def test_question_import_checks_the_exam_course_owner(client, other_teacher, course_id):
+    _, headers = other_teacher
+    async with AsyncSessionLocal() as db:
+        exam_id = await db.scalar(select(Exam.id).where(Exam.course_id == course_id))
+
+    response = await client.post('/import/questions', files=ndjson(
+        {'id': await next_id(Question), 'text': 'Injected?', 'created_date': '2030-01-01T00:00:00',
+         'difficulty_level': 'easy', 'exam_id': exam_id},
+    ), headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert response.json()['errors'] == [{'row': 1, 'errors': ['Бул маалыматты өзгөртүүгө укугуңуз жок']}]
+    async with AsyncSessionLocal() as db:
+        assert not (await db.scalars(select(Question.id).where(Question.exam_id == exam_id))).all()
+
+
+async def test_course_import_keeps_created_at_and_stamps_updated_at(client, teacher, course_id):
+    teacher_id, headers = teacher
+    async with AsyncSessionLocal() as db:
+        course = await db.get(Course, course_id)
+    started = datetime.utcnow()
+    new_id = await next_id(Course)
+    records = [{'id': id_, 'course_name': 'Imported', 'course_image': None, 'description': '-',
+                'category_id': course.category_id, 'level': 'beginner', 'price': 1, 'created_by_id': teacher_id,
+                'created_at': '2001-01-01T00:00:00', 'updated_at': '2001-01-01T00:00:00'}
+               for id_ in (course_id, new_id)]
+
+    response = await client.post('/import/courses', files=ndjson(*records), headers=headers)
+
+    assert response.json() == {'imported': 2, 'failed': 0, 'errors': []}
+    async with AsyncSessionLocal() as db:
+        updated, inserted = await db.get(Course, course_id), await db.get(Course, new_id)
+    assert updated.created_at == course.created_at
+    assert inserted.created_at == datetime(2001, 1, 1)
+    assert updated.updated_at >= started and inserted.updated_at >= started
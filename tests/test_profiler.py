@@ -0,0 +1,78 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.routing import APIRoute
+from sqlalchemy import select
+
+from course_app.db.database import AsyncSessionLocal
+from course_app.db.models import Course
+from course_app.main import course_app
+from course_app.profiler import QueryBudget, QueryProfilerMiddleware
+
+
+pytestmark = pytest.mark.anyio
+
+
+def route_budget(method: str, path: str):
+    for route in course_app.routes:
+        if isinstance(route, APIRoute) and route.path == path and method in route.methods:
+            for dependency in route.dependencies:
+                if isinstance(dependency.dependency, QueryBudget):
+                    return dependency.dependency.max_queries
+    raise LookupError(f'{method} {path} has no query budget')
+
+
+def query_count(response):
+    return int(response.headers['x-query-count'])
+
+
+async def test_course_detail_within_budget(client, course_id):
+    response = await client.get(f'/course/{course_id}/', params={'include': 'lessons,assignments,exams,rating'})
+
+    assert response.status_code == 200, response.text
+    assert query_count(response) <= route_budget('GET', '/course/{course_id}/')
+
+
+async def test_cart_routes_within_budget(client, student, course_id):
+    _, headers = student
+
+    response = await client.post('/cart/items:batch', json={'course_ids': [course_id]}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert query_count(response) <= route_budget('POST', '/cart/items:batch')
+
+    response = await client.get('/cart/', headers=headers)
+    assert response.status_code == 200, response.text
+    assert [item['course_id'] for item in response.json()['items']] == [course_id]
+    assert query_count(response) <= route_budget('GET', '/cart/')
+
+
+async def test_favorite_routes_within_budget(client, student, course_id):
+    _, headers = student
+
+    response = await client.post('/favorite/items:batch', json={'course_ids': [course_id]}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert query_count(response) <= route_budget('POST', '/favorite/items:batch')
+
+    response = await client.get('/favorite/', headers=headers)
+    assert response.status_code == 200, response.text
+    assert query_count(response) <= route_budget('GET', '/favorite/')
+
+
+async def test_strict_budget_rejects_n_plus_one(database, course_id):
+    app = FastAPI()
+    app.add_middleware(QueryProfilerMiddleware, strict=True)
+
+    @app.get('/n-plus-one', dependencies=[Depends(QueryBudget(1))])
+    async def n_plus_one():
+        async with AsyncSessionLocal() as db:
+            for _ in range(3):
+                await db.scalar(select(Course.id).where(Course.id == course_id))
+        return {'ok': True}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        response = await client.get('/n-plus-one')
+
+    assert response.status_code == 500
+    assert response.headers['x-query-count'] == '3'
+    assert response.headers['x-query-duplicates'] == '3'
+    assert response.json()['detail'] == 'Query budget exceeded: 3 > 1'
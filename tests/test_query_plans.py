@@ -0,0 +1,19 @@
+import pytest
+
+from course_app.db.database import engine
+
+
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(engine.dialect.name != 'postgresql', reason='EXPLAIN plans are checked on PostgreSQL only'),
+]
+
+
+async def test_hot_queries_use_indexes(database):
+    from benchmarks.query_plans import HOT_QUERIES, seq_scans
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql('SET enable_seqscan = off')
+        failures = {name: seq_scans(conn, statement) for name, statement in HOT_QUERIES.items()}
+
+    assert {name: tables for name, tables in failures.items() if tables} == {}
@@ -0,0 +1,22 @@
+import pytest
+
+from course_app.api.endpoints import course
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_review_invalidates_rating_caches_but_not_carts(client, student, course_id, monkeypatch):
+    _, headers = student
+    invalidated = []
+
+    async def record_tags(*tags):
+        invalidated.extend(tags)
+
+    monkeypatch.setattr(course, 'invalidate_tags', record_tags)
+    response = await client.post('/review/', json={'id': 0, 'user_id': 0, 'course_id': course_id, 'rating': '4',
+                                                   'comment': 'good'}, headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert {course.course_tag(course_id), 'course_list'} <= set(invalidated)
+    assert 'carts' not in invalidated